@@ -0,0 +1,88 @@
+# date_labels.py
+#
+# Copyright 2025 Wartybix
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <https://www.gnu.org/licenses/>.
+#
+# SPDX-License-Identifier: GPL-3.0-or-later
+
+import datetime
+from functools import lru_cache
+from gettext import ngettext
+from typing import Optional
+from scrummy.shared import date_from_day
+
+# Dates are shown as labels formatted from day numbers. Thousands of items
+# share a handful of days, so labels are cached by day. The locale is set up
+# once at startup and doesn't change while the app runs.
+#
+# Relative labels ("Today", "In 3 days") also depend on the current day. The
+# cache keeps the day it was filled for, and is cleared when refresh() finds
+# it has changed (e.g. at midnight), rather than checking on every call.
+
+LABEL_CACHE_SIZE = 1024
+
+# Days either side of today that get relative labels.
+RELATIVE_DAYS = 7
+
+def get_today() -> int:
+    return datetime.date.today().toordinal()
+
+today = get_today()
+
+@lru_cache(maxsize=LABEL_CACHE_SIZE)
+def get_label(day: int, format: str) -> str:
+    return date_from_day(day).format(format)
+
+@lru_cache(maxsize=LABEL_CACHE_SIZE)
+def get_relative(day: int, today: int) -> Optional[str]:
+    days = day - today
+
+    if days == 0:
+        return _("Today")
+    elif days == 1:
+        return _("Tomorrow")
+    elif days == -1:
+        return _("Yesterday")
+    elif 1 < days <= RELATIVE_DAYS:
+        return ngettext("In {} day", "In {} days", days).format(days)
+    elif -RELATIVE_DAYS <= days < -1:
+        return ngettext("{} day ago", "{} days ago", -days).format(-days)
+
+    return None
+
+def format_day(day: int, format: str="%x") -> str:
+    """ Formats a day number for display, in the user's locale """
+    return get_label(day, format)
+
+def get_relative_label(day: int) -> Optional[str]:
+    """ Describes a day relative to today, or None if it is too far away """
+    return get_relative(day, today)
+
+def refresh() -> bool:
+    """ Clears the cached relative labels if the day has changed.
+
+    Returns whether it had.
+    """
+    global today
+
+    new_today = get_today()
+
+    if new_today == today:
+        return False
+
+    today = new_today
+    get_relative.cache_clear()
+
+    return True
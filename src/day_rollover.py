@@ -0,0 +1,177 @@
+# day_rollover.py
+#
+# Copyright 2025 Wartybix
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <https://www.gnu.org/licenses/>.
+#
+# SPDX-License-Identifier: GPL-3.0-or-later
+
+import datetime
+import logging
+import math
+import time
+from bisect import bisect_left, bisect_right, insort
+from gi.repository import Gio, GLib
+from typing import (
+    Callable,
+    Dict,
+    Hashable,
+    Iterator,
+    List,
+    Optional,
+    Set,
+    Tuple
+)
+from scrummy import date_labels
+
+# Dates are shown relative to today (see date_labels.py), so the labels of
+# some days change when the day does: at local midnight, when the time zone
+# changes, or after the computer wakes up on a later day.
+#
+# Only days within RELATIVE_DAYS of the old or new today get different
+# labels. DayRollover works out those ranges of days, and whatever shows
+# dates looks up just what falls in them in a DayIndex, rather than
+# refreshing everything.
+
+# Ranges of day numbers, both ends included.
+DayRanges = List[Tuple[int, int]]
+
+LOCALTIME_PATH = "/etc/localtime"
+
+logger = logging.getLogger(__name__)
+
+def get_changed_ranges(old_today: int, new_today: int) -> DayRanges:
+    """ Gets the days whose relative labels differ between two todays """
+    span = date_labels.RELATIVE_DAYS
+    first, second = sorted((old_today, new_today))
+
+    if second - first <= 2 * span + 1:
+        # The two weeks overlap or touch.
+        return [(first - span, second + span)]
+
+    return [(first - span, first + span), (second - span, second + span)]
+
+def get_seconds_to_midnight() -> int:
+    tomorrow = datetime.date.today() + datetime.timedelta(days=1)
+    midnight = datetime.datetime.combine(tomorrow, datetime.time())
+
+    return max(math.ceil(midnight.timestamp() - time.time()), 1)
+
+class DayIndex():
+    """ Entries (e.g. rows) by day number, to find those in ranges of days """
+
+    def __init__(self):
+        self.entries: Dict[int, Set[Hashable]] = {}
+        self.days: List[int] = []
+
+    def add(self, day: int, entry: Hashable) -> None:
+        entries = self.entries.get(day)
+
+        if entries is None:
+            entries = self.entries[day] = set()
+            insort(self.days, day)
+
+        entries.add(entry)
+
+    def remove(self, day: int, entry: Hashable) -> None:
+        entries = self.entries.get(day)
+
+        if entries is None:
+            return
+
+        entries.discard(entry)
+
+        if not entries:
+            del self.entries[day]
+            del self.days[bisect_left(self.days, day)]
+
+    def find(self, ranges: DayRanges) -> Iterator[Hashable]:
+        """ Iterates over the entries of days in the ranges """
+        for start, end in ranges:
+            days = self.days[
+                bisect_left(self.days, start):bisect_right(self.days, end)
+            ]
+
+            for day in days:
+                yield from list(self.entries[day])
+
+class DayRollover():
+    """ Notices when today changes.
+
+    Checks once at each local midnight and when the time zone changes, and
+    whenever check() is called (e.g. when a window is activated, which also
+    covers waking from suspend). On a change, the date label caches are
+    cleared and the callback is given the days whose labels changed.
+    """
+
+    def __init__(self, on_rollover: Callable[[DayRanges], None]):
+        self.on_rollover = on_rollover
+        self.timeout_id = None
+
+        # The local time zone is read from here, unless TZ is set.
+        self.localtime_monitor = Gio.File.new_for_path(
+            LOCALTIME_PATH
+        ).monitor_file(Gio.FileMonitorFlags.NONE, None)
+        self.localtime_monitor.connect("changed", self.on_localtime_changed)
+
+        self.schedule()
+
+    def schedule(self) -> None:
+        if self.timeout_id:
+            GLib.source_remove(self.timeout_id)
+
+        self.timeout_id = GLib.timeout_add_seconds(
+            get_seconds_to_midnight(),
+            self.on_timeout
+        )
+
+    def on_timeout(self) -> bool:
+        self.timeout_id = None
+
+        # Timeouts can fire a little early, in which case nothing has changed
+        # yet and the next one is only moments away.
+        self.check()
+        self.schedule()
+
+        return GLib.SOURCE_REMOVE
+
+    def on_localtime_changed(
+        self,
+        monitor: Gio.FileMonitor,
+        file: Gio.File,
+        other_file: Optional[Gio.File],
+        event: Gio.FileMonitorEvent
+    ) -> None:
+        if event not in (
+            Gio.FileMonitorEvent.CHANGES_DONE_HINT,
+            Gio.FileMonitorEvent.CREATED,
+            Gio.FileMonitorEvent.DELETED
+        ):
+            return
+
+        # The C library only reads the time zone again when asked to.
+        time.tzset()
+        logger.info("Time zone changed")
+
+        self.check()
+        self.schedule()
+
+    def check(self) -> None:
+        old_today = date_labels.today
+
+        if not date_labels.refresh():
+            return
+
+        logger.info("Date labels changed, today is day %d", date_labels.today)
+        self.on_rollover(get_changed_ranges(old_today, date_labels.today))
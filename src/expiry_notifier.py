@@ -0,0 +1,254 @@
+# expiry_notifier.py
+#
+# Copyright 2025 Wartybix
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <https://www.gnu.org/licenses/>.
+#
+# SPDX-License-Identifier: GPL-3.0-or-later
+
+import datetime
+import heapq
+import logging
+import time
+from collections import Counter
+from gettext import ngettext
+from gi.repository import Gio, GLib
+from typing import Dict, Iterable, Optional, Tuple
+from scrummy import APPLICATION_ID
+from scrummy.pantry import FoodItem, count_titles_by_day
+
+# Food is announced twice: on the day before its date ("eat by tomorrow") and
+# on the day itself ("eat by today"), at NOTIFY_HOUR. Announcements are saved
+# in the settings so they aren't repeated when the app starts again, and ones
+# due before the app started are skipped rather than sent late.
+#
+# The notifier counts the titles of the items due on each day, and keeps a
+# min-heap of those days. Only one GLib timeout is pending at a time, for the
+# earliest announcement, so nothing runs between announcements however many
+# items there are. Days whose items have all gone are left in the heap and
+# skipped once they reach the top.
+
+NOTIFY_HOUR = 9
+
+# Number of item titles named in a notification.
+MAX_TITLES = 3
+
+TOMORROW = 0
+TODAY = 1
+
+logger = logging.getLogger(__name__)
+
+def get_deadline(day: int, kind: int) -> float:
+    """ Gets the Unix time to announce the food of a day """
+    if kind == TOMORROW:
+        day -= 1
+
+    date = datetime.date.fromordinal(day)
+    return datetime.datetime.combine(date, datetime.time(NOTIFY_HOUR)).timestamp()
+
+def get_today() -> int:
+    return datetime.date.today().toordinal()
+
+class ExpiryNotifier():
+    """ Sends notifications about food that should be eaten soon """
+
+    def __init__(self, application: Gio.Application):
+        self.application = application
+
+        self.titles: Dict[int, Counter] = {}
+        self.days = []
+
+        self.timeout_id = 0
+        self.timeout_deadline = None
+        self.held = False
+
+        self.start_time = time.time()
+
+        self.settings = Gio.Settings(schema_id=APPLICATION_ID)
+
+        # Announcements already made or skipped, as (day, kind).
+        self.announced = set(
+            self.settings.get_value("announced-expiry").unpack()
+        )
+        self.settings.connect(
+            "changed::expiry-notifications",
+            lambda *_: self.schedule()
+        )
+
+    def add_items(self, items: Iterable[FoodItem]) -> None:
+        self.add_counts(count_titles_by_day(items))
+
+    def remove_items(self, items: Iterable[FoodItem]) -> None:
+        self.remove_counts(count_titles_by_day(items))
+
+    def add_counts(self, counts: Dict[int, Counter]) -> None:
+        """ Adds the title counts of each day, see count_titles_by_day() """
+        for day, day_titles in counts.items():
+            titles = self.titles.get(day)
+
+            if titles is None:
+                titles = self.titles[day] = Counter()
+                heapq.heappush(self.days, day)
+
+            titles.update(day_titles)
+
+        self.schedule()
+
+    def remove_counts(self, counts: Dict[int, Counter]) -> None:
+        for day, day_titles in counts.items():
+            titles = self.titles.get(day)
+
+            if titles is None:
+                continue
+
+            titles.subtract(day_titles)
+
+            for title in day_titles:
+                if titles[title] <= 0:
+                    del titles[title]
+
+            if not titles:
+                del self.titles[day]
+
+        self.schedule()
+
+    def clear(self) -> None:
+        self.titles.clear()
+        self.days.clear()
+
+        self.schedule()
+
+    def get_next_announcement(self) -> Optional[Tuple[int, int]]:
+        """ Gets the (day, kind) of the next announcement to make, if any """
+        today = get_today()
+
+        while self.days:
+            day = self.days[0]
+
+            if day in self.titles and day >= today:
+                if (day, TOMORROW) not in self.announced and day > today:
+                    return day, TOMORROW
+                elif (day, TODAY) not in self.announced:
+                    return day, TODAY
+
+            # Nothing left to announce for this day.
+            heapq.heappop(self.days)
+
+        return None
+
+    def schedule(self) -> None:
+        """ Sets the timeout for the next announcement, if it has changed """
+        if self.settings.get_boolean("expiry-notifications"):
+            announcement = self.get_next_announcement()
+        else:
+            announcement = None
+
+        deadline = get_deadline(*announcement) if announcement else None
+
+        if deadline == self.timeout_deadline:
+            return
+
+        if self.timeout_id:
+            GLib.source_remove(self.timeout_id)
+            self.timeout_id = 0
+
+        self.timeout_deadline = deadline
+
+        if deadline is not None:
+            delay = max(0, int(deadline - time.time()) + 1)
+            self.timeout_id = GLib.timeout_add_seconds(delay, self.on_timeout)
+
+        self.set_held(deadline is not None)
+
+    def set_held(self, held: bool) -> None:
+        # Keep running in the background while there is food to announce,
+        # even once the window is closed.
+        if held == self.held:
+            return
+
+        if held:
+            self.application.hold()
+        else:
+            self.application.release()
+
+        self.held = held
+
+    def on_timeout(self) -> bool:
+        self.timeout_id = 0
+        self.timeout_deadline = None
+
+        now = time.time()
+
+        while True:
+            announcement = self.get_next_announcement()
+
+            if not announcement or get_deadline(*announcement) > now:
+                break
+
+            if get_deadline(*announcement) >= self.start_time:
+                self.announce(*announcement)
+
+            self.announced.add(announcement)
+
+        self.save_announced()
+        self.schedule()
+
+        return GLib.SOURCE_REMOVE
+
+    def save_announced(self) -> None:
+        # Past days can't be announced again, so they are forgotten.
+        today = get_today()
+        self.announced = {
+            announcement for announcement in self.announced
+            if announcement[0] >= today
+        }
+
+        self.settings.set_value(
+            "announced-expiry",
+            GLib.Variant("a(ii)", sorted(self.announced))
+        )
+
+    def announce(self, day: int, kind: int) -> None:
+        titles = self.titles[day]
+        num_items = sum(titles.values())
+
+        if kind == TODAY:
+            notification_id = "expiry-today"
+            title = ngettext(
+                "{} Item to Eat Today",
+                "{} Items to Eat Today",
+                num_items
+            )
+        else:
+            notification_id = "expiry-tomorrow"
+            title = ngettext(
+                "{} Item to Eat by Tomorrow",
+                "{} Items to Eat by Tomorrow",
+                num_items
+            )
+
+        names = sorted(titles)
+        body = ", ".join(names[:MAX_TITLES])
+
+        if len(names) > MAX_TITLES:
+            # TRANSLATORS: {0} is a list of food names, and {1} is a number.
+            body = _("{0} and {1} more").format(body, len(names) - MAX_TITLES)
+
+        logger.info("Announcing %d items due on day %d", num_items, day)
+
+        notification = Gio.Notification.new(title.format(num_items))
+        notification.set_body(body)
+        notification.set_priority(Gio.NotificationPriority.HIGH)
+
+        self.application.send_notification(notification_id, notification)
@@ -0,0 +1,177 @@
+# history.py
+#
+# Copyright 2025 Wartybix
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <https://www.gnu.org/licenses/>.
+#
+# SPDX-License-Identifier: GPL-3.0-or-later
+
+from gi.repository import GObject
+from typing import List, Optional
+from scrummy.pantry import FoodItem
+
+# Undoable changes are small command objects holding references to the meals
+# and items involved. Items aren't changed once they are in a meal, so holding
+# on to them is enough to put them back; nothing is copied.
+#
+# Each command is applied as one batch of changes (see
+# ScrummyWindow.batch_changes), so however many items it touches, every meal
+# it changes is updated and repositioned in the sidebar once.
+
+# Maximum number of changes that can be undone.
+HISTORY_LIMIT = 100
+
+class Command():
+    """ An undoable change to the pantry """
+
+    def redo(self, window: GObject.Object) -> None:
+        raise NotImplementedError
+
+    def undo(self, window: GObject.Object) -> None:
+        raise NotImplementedError
+
+class RemoveItems(Command):
+    def __init__(self, meal: GObject.Object, items: List[FoodItem]):
+        self.meal = meal
+        self.items = list(items)
+
+    def redo(self, window: GObject.Object) -> None:
+        window.remove_items_from_meal(self.meal, self.items)
+
+    def undo(self, window: GObject.Object) -> None:
+        window.add_items_to_meal(self.meal, self.items)
+
+class MoveItems(Command):
+    def __init__(
+        self,
+        source_meal: GObject.Object,
+        dest_meal: GObject.Object,
+        items: List[FoodItem]
+    ):
+        self.source_meal = source_meal
+        self.dest_meal = dest_meal
+        self.items = list(items)
+
+    def redo(self, window: GObject.Object) -> None:
+        window.remove_items_from_meal(self.source_meal, self.items)
+        window.add_items_to_meal(self.dest_meal, self.items)
+
+    def undo(self, window: GObject.Object) -> None:
+        window.remove_items_from_meal(self.dest_meal, self.items)
+        window.add_items_to_meal(self.source_meal, self.items)
+
+class ReplaceItem(Command):
+    """ An edit of an item's name or date """
+
+    def __init__(
+        self,
+        meal: GObject.Object,
+        old_item: FoodItem,
+        new_item: FoodItem
+    ):
+        self.meal = meal
+        self.old_item = old_item
+        self.new_item = new_item
+
+    def redo(self, window: GObject.Object) -> None:
+        window.replace_item_in_meal(self.meal, self.old_item, self.new_item)
+
+    def undo(self, window: GObject.Object) -> None:
+        window.replace_item_in_meal(self.meal, self.new_item, self.old_item)
+
+class RenameMeal(Command):
+    def __init__(self, meal: GObject.Object, old_title: str, new_title: str):
+        self.meal = meal
+        self.old_title = old_title
+        self.new_title = new_title
+
+    def redo(self, window: GObject.Object) -> None:
+        window.set_meal_title(self.meal, self.new_title)
+
+    def undo(self, window: GObject.Object) -> None:
+        window.set_meal_title(self.meal, self.old_title)
+
+class RemoveMeal(Command):
+    """ A meal being eaten """
+
+    def __init__(self, meal: GObject.Object):
+        self.meal = meal
+
+    def redo(self, window: GObject.Object) -> None:
+        window.remove_meal(self.meal)
+
+    def undo(self, window: GObject.Object) -> None:
+        window.insert_meal(self.meal)
+
+class History(GObject.Object):
+    """ The stacks of changes that can be undone and redone """
+    __gtype_name__ = "History"
+
+    can_undo = GObject.Property(type=bool, default=False)
+    can_redo = GObject.Property(type=bool, default=False)
+
+    def __init__(self, window: GObject.Object, **kwargs):
+        super().__init__(**kwargs)
+
+        self.window = window
+        self.undo_stack = []
+        self.redo_stack = []
+
+    def perform(self, command: Command) -> None:
+        """ Applies a command, and makes it the next to be undone """
+        with self.window.batch_changes():
+            command.redo(self.window)
+
+        self.undo_stack.append(command)
+        del self.undo_stack[:-HISTORY_LIMIT]
+        self.redo_stack.clear()
+
+        self.update_state()
+
+    def undo(self, command: Optional[Command]=None) -> None:
+        """ Undoes the last command, if it is the given command (if any) """
+        if not self.undo_stack:
+            return
+
+        if command and self.undo_stack[-1] is not command:
+            # Something else has happened since, so this is out of date.
+            return
+
+        command = self.undo_stack.pop()
+        with self.window.batch_changes():
+            command.undo(self.window)
+        self.redo_stack.append(command)
+
+        self.update_state()
+
+    def redo(self) -> None:
+        if not self.redo_stack:
+            return
+
+        command = self.redo_stack.pop()
+        with self.window.batch_changes():
+            command.redo(self.window)
+        self.undo_stack.append(command)
+
+        self.update_state()
+
+    def clear(self) -> None:
+        self.undo_stack.clear()
+        self.redo_stack.clear()
+
+        self.update_state()
+
+    def update_state(self) -> None:
+        self.props.can_undo = len(self.undo_stack) > 0
+        self.props.can_redo = len(self.redo_stack) > 0
@@ -17,11 +17,13 @@
 #
 # SPDX-License-Identifier: GPL-3.0-or-later
 
-from gi.repository import Adw, Gtk, GLib, Gio
+from gi.repository import Adw, Gtk, GLib, GObject
 from scrummy import PREFIX
 from typing import Optional
-from scrummy.shared import min_date
-from scrummy.new_ingredient_dialog import NewIngredientDialog
+from scrummy.ingredient_store import FoodItemObject
+from scrummy.pantry import FoodItem
+from scrummy.history import ReplaceItem
+from scrummy.date_labels import format_day, get_relative_label
 
 # TODO: low coupling high cohesion... move everything calling window code into
 # a passed function?
@@ -32,24 +34,20 @@ def show_edit_dialog(
     parameter: GLib.Variant
 ) -> None:
     window = ingredient.get_ancestor(Adw.ApplicationWindow)
+    item = ingredient.item_object.item
+    meal = ingredient.item_object.meal
 
-    def do_edit(name: str, date: Optional[GLib.DateTime]) -> None:
-        selected_meal = window.sidebar.get_selected_item()
-        old_date = selected_meal.get_bb_date()
+    def do_edit(name: str, bb_day: Optional[int]) -> None:
+        new_item = FoodItem(name, bb_day, item.frozen)
+        window.history.perform(ReplaceItem(meal, item, new_item))
 
-        ingredient.set_title(name)
-        ingredient.set_bb_date(date)
-
-        selected_meal.update()
-
-        if selected_meal != window.unsorted_food:
-            sidebar_section_model = window.sidebar_section_model
-            sidebar_section_model.update_meal_position(selected_meal, old_date)
+    # Imported when first used, to keep startup short.
+    from scrummy.new_ingredient_dialog import NewIngredientDialog
 
     dialog = NewIngredientDialog(
         do_edit,
-        ingredient.get_title(),
-        ingredient.get_bb_date()
+        item.title,
+        item.bb_day
     )
 
     dialog.present(window)
@@ -59,12 +57,11 @@ def duplicate(
     action_name: str,
     parameter: GLib.Variant
 ) -> None:
-    new_ingredient = ingredient.copy()
+    item_object = ingredient.item_object
+    new_item = item_object.item.copy()
 
     window = ingredient.get_ancestor(Adw.ApplicationWindow)
-    selected_meal = window.sidebar.get_selected_item()
-
-    selected_meal.add_ingredient(new_ingredient)
+    window.add_items_to_meal(item_object.meal, [new_item])
 
 def eat(
     ingredient: 'Ingredient',
@@ -72,7 +69,8 @@ def eat(
     parameter: GLib.Variant
 ) -> None:
     window = ingredient.get_ancestor(Adw.ApplicationWindow)
-    window.do_eat_ingredients([ingredient])
+    item_object = ingredient.item_object
+    window.do_eat_ingredients([item_object.item], item_object.meal)
 
 def move_to(
     ingredient: 'Ingredient',
@@ -80,7 +78,8 @@ def move_to(
     parameter: GLib.Variant
 ) -> None:
     window = ingredient.get_ancestor(Adw.ApplicationWindow)
-    window.do_show_move_to_dialog([ingredient])
+    item_object = ingredient.item_object
+    window.do_show_move_to_dialog([item_object.item], item_object.meal)
 
 @Gtk.Template(resource_path=f"{PREFIX}/ingredient.ui")
 class Ingredient(Adw.ActionRow):
@@ -91,89 +90,83 @@ class Ingredient(Adw.ActionRow):
     menu_button = Gtk.Template.Child()
     check_button = Gtk.Template.Child()
 
-    def __init__(
-        self,
-        title: str,
-        bb_date: Optional[GLib.DateTime],
-        window_move_to_action: Gio.SimpleAction,
-        **kwargs
-    ):
+    def __init__(self, **kwargs):
         super().__init__(**kwargs)
 
-        self.set_title(title)
-        self.set_bb_date(bb_date)
-
-        self.frozen = False
+        self.item_object = None
+        self.show_meal = False
 
         self.install_action('ingredient.edit', None, show_edit_dialog)
         self.install_action('ingredient.duplicate', None, duplicate)
         self.install_action('ingredient.eat', None, eat)
         self.install_action('ingredient.move_to', None, move_to)
 
-        self.window_move_to_action = window_move_to_action
-        self.set_can_move(self.window_move_to_action, None)
+    def bind(self, item_object: FoodItemObject, show_meal: bool=False) -> None:
+        """ Shows the given food item in this (possibly recycled) row """
+        self.item_object = item_object
+        self.show_meal = show_meal
 
-        self.window_move_to_action.connect(
-            "notify::enabled",
-            self.set_can_move
-        )
+        self.set_title(item_object.item.title)
+        self.update_subtitle()
 
-    def set_can_move(self, action: Gio.Action, parameter: GLib.Variant) -> None:
-        print("set can move triggered")
-        self.action_set_enabled('ingredient.move_to', action.get_enabled())
+    def update_subtitle(self) -> None:
+        """ Shows the item's date, e.g. again once the day has changed """
+        self.set_bb_day(self.item_object.item.bb_day)
 
-    def set_bb_date(self, bb_date: GLib.DateTime) -> None:
-        self.bb_date = bb_date
+        if self.show_meal:
+            self.set_subtitle(
+                # TRANSLATORS: {0} is the name of a meal, and {1} is the date
+                # of an item in it (e.g. 'Use by 01/01/2026').
+                _("{0} · {1}").format(
+                    self.item_object.meal.get_title(),
+                    self.get_subtitle()
+                )
+            )
 
-        if bb_date:
-            date_str = bb_date.format("%x")
-            self.set_subtitle(_("Use by {}").format(date_str))
-        else:
-            self.set_subtitle(_("Undated"))
-
-    def get_bb_date(self) -> Optional[GLib.DateTime]:
-        return self.bb_date
+    def unbind(self) -> None:
+        self.item_object = None
 
-    def get_bb_sort_date(self) -> GLib.DateTime:
-        if self.bb_date:
-            return self.bb_date
-        else:
-            return min_date
+    @Gtk.Template.Callback()
+    def on_menu_button_active_changed(
+        self,
+        menu_button: Gtk.MenuButton,
+        pspec: GObject.ParamSpec
+    ) -> None:
+        if not menu_button.get_active():
+            return
 
-    def set_selectable(self, is_selectable: bool) -> None:
-        self.end_viewstack.set_visible_child(
-            self.check_button if is_selectable else self.menu_button
-        )
+        # Whether items can be moved is shared by every row, so it is read
+        # from the window's action when a menu opens, rather than each row
+        # following the action's changes.
+        window = self.get_ancestor(Adw.ApplicationWindow)
+        can_move = window.move_selected_ingredients_action.get_enabled()
 
-        self.check_button.set_sensitive(is_selectable)
-        self.check_button.set_active(False)
+        self.action_set_enabled('ingredient.move_to', can_move)
 
-    @Gtk.Template.Callback()
-    def on_selection_toggled(self, check_button: Gtk.CheckButton) -> None:
-        if not check_button.get_sensitive():
-            # Don't do anything if check button is not sensitive.
+    def set_bb_day(self, bb_day: Optional[int]) -> None:
+        if not bb_day:
+            self.set_subtitle(_("Undated"))
             return
 
-        # TODO: low coupling high cohesion... change to passed function
-        window = self.get_ancestor(Adw.ApplicationWindow)
+        relative_label = get_relative_label(bb_day)
 
-        if check_button.get_active():
-            window.add_selection(self)
+        if relative_label:
+            self.set_subtitle(
+                # TRANSLATORS: {0} is a date, and {1} describes it relative to
+                # today (e.g. 'Tomorrow' or 'In 3 days').
+                _("Use by {0} · {1}").format(format_day(bb_day), relative_label)
+            )
         else:
-            window.remove_selection(self)
+            self.set_subtitle(_("Use by {}").format(format_day(bb_day)))
 
-    def set_selected(self, is_selected: bool) -> None:
-        self.check_button.set_active(is_selected)
+    @GObject.Property(type=bool, default=False)
+    def select_mode(self) -> bool:
+        return self.end_viewstack.get_visible_child() == self.check_button
 
-    def copy(self) -> 'Ingredient':
-        return Ingredient(
-            self.get_title(),
-            self.bb_date,
-            self.window_move_to_action
+    @select_mode.setter
+    def select_mode(self, enabled: bool) -> None:
+        self.end_viewstack.set_visible_child(
+            self.check_button if enabled else self.menu_button
         )
 
-    def __str__(self):
-        bb_date = self.bb_date
-        bb_msg = f"exp. {bb_date.format('%x')}" if bb_date else "undated"
-
-        return f"{self.get_title()} ({bb_msg}) -- {'un' if not self.frozen else ''}frozen"
+        self.check_button.set_sensitive(enabled)
@@ -0,0 +1,71 @@
+# ingredient_store.py
+#
+# Copyright 2025 Wartybix
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <https://www.gnu.org/licenses/>.
+#
+# SPDX-License-Identifier: GPL-3.0-or-later
+
+from gi.repository import GObject, Gio
+from weakref import WeakValueDictionary
+from scrummy.pantry import FoodItem, MealRecord
+
+class FoodItemObject(GObject.Object):
+    """ A GObject handle on a food item, for list models and row widgets """
+    __gtype_name__ = "FoodItemObject"
+
+    def __init__(self, item: FoodItem, meal: GObject.Object, **kwargs):
+        super().__init__(**kwargs)
+
+        self.item = item
+        self.meal = meal
+
+class IngredientStore(GObject.Object, Gio.ListModel):
+    """ A list model exposing the items of a meal record.
+
+    Handles on the items are only created when something asks for them (e.g.
+    the widget showing the meal), and are dropped once nothing uses them.
+    """
+    __gtype_name__ = "IngredientStore"
+
+    def __init__(self, record: MealRecord, meal: GObject.Object, **kwargs):
+        super().__init__(**kwargs)
+
+        self.record = record
+        self.meal = meal
+        self.handles = WeakValueDictionary()
+
+    def do_get_item_type(self) -> GObject.GType:
+        return FoodItemObject.__gtype__
+
+    def do_get_n_items(self) -> int:
+        return len(self.record.items)
+
+    def do_get_item(self, position: int) -> FoodItemObject:
+        items = self.record.items
+
+        if position >= len(items):
+            return None
+
+        item = items[position]
+        handle = self.handles.get(item)
+
+        if handle is None:
+            handle = FoodItemObject(item, self.meal)
+            self.handles[item] = handle
+
+        return handle
+
+    def __len__(self):
+        return len(self.record.items)
@@ -0,0 +1,232 @@
+# instrumentation.py
+#
+# Copyright 2025 Wartybix
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <https://www.gnu.org/licenses/>.
+#
+# SPDX-License-Identifier: GPL-3.0-or-later
+
+import json
+import logging
+import os
+import sys
+import threading
+import time
+import traceback
+from collections import deque
+from functools import wraps
+from typing import Callable, Dict, List
+
+# Built-in profiling for real sessions, without an external profiler. Start
+# the app with SCRUMMY_PROFILE set to a file path, and when it quits it
+# writes a JSON report there with:
+#
+#   spans     calls of the functions decorated with @traced: how many, and
+#             their total and longest durations
+#   counters  calls made into GI on hot paths (list model changes, sidebar
+#             and row updates, filters, drawing) and items-changed emissions
+#   stalls    times the main loop was blocked for longer than STALL_THRESHOLD,
+#             with the spans that ran meanwhile and where the main thread was
+#
+# When the variable isn't set, @traced returns functions unchanged and GI
+# methods aren't wrapped, so nothing is added to the hot paths.
+
+PROFILE_VARIABLE = "SCRUMMY_PROFILE"
+
+# The main loop is checked every HEARTBEAT_INTERVAL, and counts as stalled
+# when a check is this much later than it should be.
+HEARTBEAT_INTERVAL = 0.02
+STALL_THRESHOLD = 0.05
+
+# Number of finished spans kept, to show what ran during a stall.
+RECENT_SPANS = 256
+MAX_STALLS = 500
+
+logger = logging.getLogger(__name__)
+
+output_path = os.environ.get(PROFILE_VARIABLE)
+enabled = bool(output_path)
+
+start_time = time.perf_counter()
+
+# Name to [count, total seconds, longest seconds].
+span_stats: Dict[str, List] = {}
+recent_spans = deque(maxlen=RECENT_SPANS)
+counters: Dict[str, int] = {}
+stalls: List[dict] = []
+
+def record_span(name: str, start: float, end: float) -> None:
+    stats = span_stats.get(name)
+
+    if stats is None:
+        stats = span_stats[name] = [0, 0.0, 0.0]
+
+    duration = end - start
+    stats[0] += 1
+    stats[1] += duration
+    stats[2] = max(stats[2], duration)
+
+    recent_spans.append((name, start, end))
+
+def traced(func: Callable) -> Callable:
+    """ Records the duration of every call of a function, when profiling """
+    if not enabled:
+        return func
+
+    name = f"{func.__module__}.{func.__qualname__}"
+
+    @wraps(func)
+    def wrapper(*args, **kwargs):
+        start = time.perf_counter()
+
+        try:
+            return func(*args, **kwargs)
+        finally:
+            record_span(name, start, time.perf_counter())
+
+    return wrapper
+
+def count(name: str, amount: int=1) -> None:
+    counters[name] = counters.get(name, 0) + amount
+
+def count_calls(cls: type, method_names: List[str], emits: bool=False) -> None:
+    """ Counts the calls of GI methods made from Python """
+    for method_name in method_names:
+        method = getattr(cls, method_name)
+        name = f"{cls.__module__.rsplit('.', 1)[-1]}.{cls.__name__}.{method_name}"
+
+        def wrapper(*args, method=method, name=name, **kwargs):
+            count(name)
+            if emits:
+                count("items-changed")
+
+            return method(*args, **kwargs)
+
+        setattr(cls, method_name, wrapper)
+
+def count_gi_calls() -> None:
+    from gi.repository import Adw, Gio, Gtk
+
+    # Each of these emits items-changed once.
+    count_calls(Gio.ListModel, ["items_changed"], emits=True)
+    count_calls(Gio.ListStore, ["splice", "insert", "remove", "append"], emits=True)
+
+    count_calls(Gio.ListStore, ["get_item"])
+    count_calls(Adw.Sidebar, ["insert", "remove", "set_selected"])
+    count_calls(
+        Adw.SidebarItem,
+        ["set_title", "set_subtitle", "set_icon_paintable"]
+    )
+    count_calls(Gtk.Filter, ["changed"])
+    count_calls(Gtk.FilterListModel, ["set_model", "set_filter"])
+    count_calls(Gtk.Snapshot, ["append_fill", "to_paintable"])
+
+class StallDetector():
+    """ Detects when the main loop is blocked.
+
+    A heartbeat on the main loop notes when it last ran, and measures how late
+    it is. A watchdog thread samples the main thread's stack while the
+    heartbeat is overdue, to show where it was blocked.
+    """
+
+    def __init__(self):
+        self.main_thread_id = threading.get_ident()
+        self.last_beat = time.perf_counter()
+        self.stack = None
+
+    def start(self) -> None:
+        from gi.repository import GLib
+
+        GLib.timeout_add(int(HEARTBEAT_INTERVAL * 1000), self.on_heartbeat)
+
+        threading.Thread(
+            target=self.watch,
+            name="stall-detector",
+            daemon=True
+        ).start()
+
+    def on_heartbeat(self) -> bool:
+        now = time.perf_counter()
+        stall_start = self.last_beat + HEARTBEAT_INTERVAL
+        lateness = now - stall_start
+
+        if lateness > STALL_THRESHOLD and len(stalls) < MAX_STALLS:
+            stalls.append({
+                "start_ms": (stall_start - start_time) * 1000,
+                "duration_ms": lateness * 1000,
+                "spans": [
+                    {"name": name, "duration_ms": (end - start) * 1000}
+                    for name, start, end in recent_spans
+                    if end >= stall_start
+                ],
+                "stack": self.stack
+            })
+
+        self.last_beat = now
+        self.stack = None
+
+        return True
+
+    def watch(self) -> None:
+        while True:
+            time.sleep(HEARTBEAT_INTERVAL)
+
+            overdue = time.perf_counter() - self.last_beat - HEARTBEAT_INTERVAL
+
+            if overdue > STALL_THRESHOLD and self.stack is None:
+                frame = sys._current_frames().get(self.main_thread_id)
+
+                if frame:
+                    self.stack = traceback.format_stack(frame)
+
+def start() -> None:
+    """ Starts profiling, if enabled. Call from the main thread. """
+    if not enabled:
+        return
+
+    count_gi_calls()
+    StallDetector().start()
+
+    logger.info("Profiling to %s", output_path)
+
+def get_report() -> dict:
+    return {
+        "duration_seconds": time.perf_counter() - start_time,
+        "spans": {
+            name: {
+                "count": num_calls,
+                "total_ms": total * 1000,
+                "mean_ms": total * 1000 / num_calls,
+                "max_ms": longest * 1000
+            }
+            for name, (num_calls, total, longest) in sorted(
+                span_stats.items(),
+                key=lambda entry: entry[1][1],
+                reverse=True
+            )
+        },
+        "counters": dict(sorted(counters.items())),
+        "stalls": stalls
+    }
+
+def save() -> None:
+    """ Writes the report to the profile file, if profiling """
+    if not enabled:
+        return
+
+    try:
+        with open(output_path, "w", encoding="utf-8") as file:
+            json.dump(get_report(), file, indent=2)
+    except OSError as e:
+        logger.warning("Could not write profile to %s: %s", output_path, e)
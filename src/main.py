@@ -17,16 +17,31 @@
 #
 # SPDX-License-Identifier: GPL-3.0-or-later
 
+import logging
+import os
 import sys
 import gi
 
 gi.require_version('Gtk', '4.0')
 gi.require_version('Adw', '1')
 
-from gi.repository import Gtk, Gio, Adw
+from gi.repository import Gtk, Gio, GLib, Adw
 from .window import ScrummyWindow
-from scrummy import APPLICATION_ID, PREFIX, VERSION
-
+from .expiry_notifier import ExpiryNotifier
+from .pantry_search import SearchProvider
+from .day_rollover import DayRanges, DayRollover
+from scrummy import (
+    APPLICATION_ID,
+    PREFIX,
+    VERSION,
+    instrumentation,
+    startup
+)
+
+# Set to a level name (e.g. 'debug' or 'info') to log more than warnings.
+LOG_LEVEL_VARIABLE = "SCRUMMY_LOG"
+
+logger = logging.getLogger(__name__)
 
 # TODO: Move flatpak JSON file to build-aux 
 
@@ -43,6 +58,38 @@ class ScrummyApplication(Adw.Application):
 
         self.set_accels_for_action('win.open_file', ['<Ctrl>o'])
         self.set_accels_for_action('win.new_file', ['<Ctrl>n'])
+        self.set_accels_for_action('win.undo', ['<Ctrl>z'])
+        self.set_accels_for_action('win.redo', ['<Ctrl><Shift>z'])
+
+        # Shared by the windows, so it keeps running once they are closed.
+        self.expiry_notifier = ExpiryNotifier(self)
+
+        # Notifications keep the app running in the background, so they are
+        # only sent once turned on from the main menu.
+        self.add_action(
+            self.expiry_notifier.settings.create_action("expiry-notifications")
+        )
+
+        self.search_provider = SearchProvider(self)
+
+        # Stay around for a while after answering the desktop search, rather
+        # than starting again for every search.
+        self.set_inactivity_timeout(10000)
+
+        self.day_rollover = DayRollover(self.on_day_rollover)
+
+    def do_dbus_register(self, connection, object_path):
+        Adw.Application.do_dbus_register(self, connection, object_path)
+        self.search_provider.register(
+            connection,
+            object_path + "/SearchProvider"
+        )
+
+        return True
+
+    def do_dbus_unregister(self, connection, object_path):
+        self.search_provider.unregister(connection)
+        Adw.Application.do_dbus_unregister(self, connection, object_path)
 
     def do_activate(self):
         """Called when the application is activated.
@@ -56,12 +103,40 @@ class ScrummyApplication(Adw.Application):
             if self.get_application_id() == "io.github.wartybix.Scrummy.Devel":
                 win.get_style_context().add_class("devel")
 
+            startup.mark("create window")
+
+            # Idle callbacks run after the window has been drawn.
+            GLib.idle_add(self.on_first_frame)
+
         win.present()
 
+    def do_shutdown(self):
+        # Quitting (e.g. with Ctrl+Q) doesn't close the windows first.
+        for window in self.get_windows():
+            if isinstance(window, ScrummyWindow):
+                window.close_journal()
+
+        Adw.Application.do_shutdown(self)
+
+    def refresh_date_labels(self):
+        """Shows dates again in every window, if the day has changed."""
+        self.day_rollover.check()
+
+    def on_day_rollover(self, ranges: DayRanges):
+        for window in self.get_windows():
+            if isinstance(window, ScrummyWindow):
+                window.on_date_labels_changed(ranges)
+
+    def on_first_frame(self):
+        startup.mark("show window")
+        startup.report()
+
+        return GLib.SOURCE_REMOVE
+
     def on_about_action(self, *args):
         # TODO: Update
 
-        print(APPLICATION_ID)
+        logger.debug("Showing about dialog for %s", APPLICATION_ID)
 
         """Callback for the app.about action."""
         # about = Adw.AboutDialog(application_name='scrummy',
@@ -94,7 +169,7 @@ class ScrummyApplication(Adw.Application):
 
     def on_preferences_action(self, widget, _):
         """Callback for the app.preferences action."""
-        print('app.preferences action activated')
+        logger.debug("app.preferences action activated")
 
     def create_action(self, name, callback, shortcuts=None):
         """Add an application action.
@@ -112,7 +187,28 @@ class ScrummyApplication(Adw.Application):
             self.set_accels_for_action(f"app.{name}", shortcuts)
 
 
+def setup_logging():
+    """Configures the app's loggers from the environment."""
+    level_name = os.environ.get(LOG_LEVEL_VARIABLE, "warning").upper()
+    level = logging.getLevelName(level_name)
+
+    if not isinstance(level, int):
+        level = logging.WARNING
+
+    logging.basicConfig(
+        format="%(asctime)s %(levelname)s %(name)s: %(message)s"
+    )
+    logging.getLogger("scrummy").setLevel(level)
+
+
 def main(version):
     """The application's entry point."""
+    setup_logging()
+    instrumentation.start()
+
     app = ScrummyApplication()
-    return app.run(sys.argv)
+    status = app.run(sys.argv)
+
+    instrumentation.save()
+
+    return status
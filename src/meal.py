@@ -17,31 +17,33 @@
 #
 # SPDX-License-Identifier: GPL-3.0-or-later
 
-from scrummy.ingredient import Ingredient
-from scrummy import PREFIX
+from scrummy.pantry import FoodItem, MealRecord
+from scrummy.ingredient_store import IngredientStore
+from scrummy.instrumentation import traced
+from scrummy.search_index import SearchIndex
+from scrummy.date_labels import format_day
 from typing import List, Optional
 from gettext import ngettext
-from gi.repository import Adw, Gtk, Gio, Gsk, Graphene, Gdk, GLib
-from ctypes import c_uint32
-
-def compare_ingredients(a: Ingredient, b: Ingredient) -> int:
-    a_bb_sort_date = a.get_bb_sort_date()
-    b_bb_sort_date = b.get_bb_sort_date()
-
-    comparison = a_bb_sort_date.compare(b_bb_sort_date)
-
-    if comparison == 0:
-        a_title = a.get_title()
-        b_title = b.get_title()
-
-        if a_title < b_title:
-            return -1
-        elif a_title == b_title:
-            return 0
-        else:
-            return 1
-    else:
-        return comparison
+from gi.repository import Adw, Gtk, Gsk, Graphene, Gdk, GObject
+from functools import lru_cache
+
+# Meals are marked with one of these colours, picked from their title.
+COLORS = [
+   "#337fdc", # blue
+   "#0f9ac8", # cyan
+   "#29ae74", # green
+   "#6ab85b", # lime
+   "#d29d09", # yellow
+   "#d68400", # gold
+   "#ed5b00", # orange
+   "#e62d42", # raspberry
+   "#e33b6a", # magenta
+   "#9945b5", # purple
+   "#7a59ca", # violet
+   "#b08952", # beige
+   "#785336", # brown
+   "#6e6d71", # gray
+]
 
 # Function taken from:
 # https://mojoauth.com/hashing/bernsteins-hash-djb2-in-python/
@@ -49,77 +51,89 @@ def compare_ingredients(a: Ingredient, b: Ingredient) -> int:
 def djb2_hash(string):
     hash_value = 5381  # Initial hash value
     for char in string:  # Iterate through each character
-        hash_value = (hash_value << 5) + hash_value + ord(char)  # Update hash value
-        hash_value = c_uint32(hash_value).value # Keep limited to 32 bit unsigned integer
+        # Update hash value, keeping it to a 32 bit unsigned integer
+        hash_value = ((hash_value << 5) + hash_value + ord(char)) & 0xFFFFFFFF
     return hash_value  # Return final hash value
-    
-# TODO: check there aren't problems when changing timezone.
+
+@lru_cache(maxsize=1024)
+def get_color_index(title: str) -> int:
+    return djb2_hash(title) % len(COLORS)
+
+@lru_cache(maxsize=None)
+@traced
+def get_color_paintable(color_index: int) -> Gdk.Paintable:
+    """ Gets the dot shown next to meals of a colour, drawing it only once """
+    snapshot = Gtk.Snapshot()
+
+    path_builder = Gsk.PathBuilder.new()
+    path_builder.add_circle(Graphene.Point().init(1.0, 1.0), 1.0)
+
+    circle = path_builder.to_path()
+
+    rgba = Gdk.RGBA()
+    rgba.parse(COLORS[color_index])
+
+    snapshot.append_fill(circle, Gsk.FillRule.WINDING, rgba)
+
+    return snapshot.to_paintable()
 
 class Meal(Adw.SidebarItem):
     """ Sidebar item representing a meal """
     __gtype_name__ = "Meal"
 
-    def __init__(
-        self,
-        name: str="",
-        ingredients: Gio.ListStore=Gio.ListStore(),
-        misc_meal: bool=True, # TODO: maybe make this an inheritance thing instead?
-        **kwargs
-    ):
+    def __init__(self, record: Optional[MealRecord]=None, **kwargs):
         super().__init__(**kwargs)
 
-        # TODO: simplify ingredients parameter?
-
-        self.ingredients = ingredients
-        self.misc_meal = misc_meal
-        self.cached_bb_date = None
-        self.cache_outdated = True
-
-        self.set_title(name)
-        self.update_subtitle()
-
-    def set_title(self, name) -> None:
-        super().set_title(name)
+        # Meals created from a template (e.g. 'Unsorted Food') don't pass a
+        # record, and are miscellaneous food lists.
+        self.record = record if record is not None else MealRecord(misc=True)
+        self.ingredients = IngredientStore(self.record, self)
 
-        if not self.misc_meal:
-            snapshot = Gtk.Snapshot()
+        # Built when the meal is first searched, then kept up to date with the
+        # items, so searches don't rescan the meal. Meals that are never
+        # searched (e.g. fresh duplicates) don't pay for it.
+        self._search_index = None
 
-            path_builder = Gsk.PathBuilder.new()
-            path_builder.add_circle(Graphene.Point().init(1.0, 1.0), 1.0)
+        self.connect("notify::title", self.on_title_changed)
 
-            circle = path_builder.to_path()
+        self.set_title(self.record.title)
+        self.update_subtitle()
 
-            colors = [
-               "#337fdc", # blue
-               "#0f9ac8", # cyan
-               "#29ae74", # green
-               "#6ab85b", # lime
-               "#d29d09", # yellow
-               "#d68400", # gold
-               "#ed5b00", # orange
-               "#e62d42", # raspberry
-               "#e33b6a", # magenta
-               "#9945b5", # purple
-               "#7a59ca", # violet
-               "#b08952", # beige
-               "#785336", # brown
-               "#6e6d71", # gray
-            ]
+    @property
+    def search_index(self) -> SearchIndex:
+        if self._search_index is None:
+            self._search_index = SearchIndex()
+            self._search_index.add_many(self.record.items)
 
-            rgba = Gdk.RGBA()
+        return self._search_index
 
-            color_class = djb2_hash(name) % len(colors)
+    def update_search_index(
+        self,
+        old_items: List[FoodItem],
+        new_items: List[FoodItem]
+    ) -> None:
+        if self._search_index is not None:
+            self._search_index.remove_many(old_items)
+            self._search_index.add_many(new_items)
 
-            rgba.parse(colors[color_class])
+    @property
+    def misc_meal(self) -> bool:
+        return self.record.misc
 
-            snapshot.append_fill(circle, Gsk.FillRule.WINDING, rgba)
+    def on_title_changed(self, meal: 'Meal', pspec: GObject.ParamSpec) -> None:
+        self.record.title = self.get_title()
 
-            paintable = snapshot.to_paintable()
+    @traced
+    def set_title(self, name) -> None:
+        super().set_title(name)
 
-            self.set_icon_paintable(paintable)
+        if not self.misc_meal:
+            self.set_icon_paintable(
+                get_color_paintable(get_color_index(name))
+            )
 
     def update_subtitle(self) -> None:
-        num_ingredients = len(self.ingredients)
+        num_ingredients = len(self.record)
         if self.misc_meal:
             subtitle = ngettext("{} Item", "{} Items", num_ingredients)
         else:
@@ -129,54 +143,77 @@ class Meal(Adw.SidebarItem):
             subtitle.format(num_ingredients)
         )
 
-    def get_bb_date(self) -> Optional[GLib.DateTime]:
-        if not self.cache_outdated:
-            return self.cached_bb_date
+    def get_bb_day(self) -> Optional[int]:
+        return self.record.get_bb_day()
 
-        ingredient_dates = set(map(
-            lambda x: x.get_bb_date(), self.ingredients
-        ))
+    def add_ingredient(self, item: FoodItem) -> None:
+        (item,) = self.record.distinct_items([item])
+        position = self.record.insert(item)
+        self.update_search_index([], [item])
+        self.ingredients.items_changed(position, 0, 1)
+        self.update_subtitle()
 
-        if not ingredient_dates or None in ingredient_dates:
-            self.cached_bb_date = None
-        else:
-            min_unix = min(set(map(lambda x: x.to_unix(), ingredient_dates)))
-            self.cached_bb_date = GLib.DateTime.new_from_unix_local(min_unix)
+    @traced
+    def add_ingredients(self, items: List[FoodItem]) -> None:
+        """ Adds many ingredients, with one change to the list model """
+        items = self.record.distinct_items(items)
+        position, removed, added = self.record.insert_many(items)
+        self.update_search_index([], items)
+        self.ingredients.items_changed(position, removed, added)
+        self.update_subtitle()
 
-        self.cache_outdated = False
-        return self.cached_bb_date
+    @traced
+    def remove_ingredients(self, items: List[FoodItem]) -> None:
+        """ Removes many ingredients, with one change to the list model """
+        position, removed, added = self.record.remove_many(items)
+        self.update_search_index(items, [])
+        self.ingredients.items_changed(position, removed, added)
+        self.update_subtitle()
+
+    def replace_ingredient(self, old_item: FoodItem, new_item: FoodItem) -> None:
+        self.update_ingredients([old_item], [new_item])
 
-    def add_ingredient(self, ingredient: Ingredient) -> None:
-        self.ingredients.insert_sorted(ingredient, compare_ingredients)
+    @traced
+    def update_ingredients(
+        self,
+        old_items: List[FoodItem],
+        new_items: List[FoodItem]
+    ) -> None:
+        """ Removes and adds ingredients, with one change to the list model """
+        new_items = self.record.distinct_items(new_items)
+        position, removed, added = self.record.replace_many(old_items, new_items)
+        self.update_search_index(old_items, new_items)
+        self.ingredients.items_changed(position, removed, added)
         self.update_subtitle()
-        self.cache_outdated = True
 
-    def update(self):
-        self.ingredients.sort(compare_ingredients)
-        self.cache_outdated = True
+    @traced
+    def set_ingredients(self, items: List[FoodItem]) -> None:
+        """ Replaces every ingredient of the meal at once """
+        num_removed = len(self.record)
 
-    def remove_ingredient(self, ingredient: Ingredient) -> None:
-        index = ingredient.get_index()
-        self.ingredients.remove(index)
+        self.record.set_items(items)
+        self._search_index = None
 
+        self.ingredients.items_changed(0, num_removed, len(items))
         self.update_subtitle()
 
-        self.cache_outdated = True
+    def remove_ingredient(self, item: FoodItem) -> None:
+        position = self.record.remove(item)
+        self.update_search_index([item], [])
+        self.ingredients.items_changed(position, 1, 0)
 
-    def set_selectable(self, is_selectable: bool) -> None:
-        for ingredient in self.ingredients:
-            ingredient.set_selectable(is_selectable)
+        self.update_subtitle()
 
     def __str__(self):
-        bb_date = self.get_bb_date()
+        bb_day = self.get_bb_day()
 
-        bb_msg = f"exp. {bb_date.format('%x')}" if bb_date else "undated"
+        bb_msg = f"exp. {format_day(bb_day)}" if bb_day else "undated"
 
         msg = f"{self.get_title()} ({bb_msg})"
 
-        if self.ingredients:
-            for ingredient in self.ingredients:
-                msg += f'\n\t{ingredient}'
+        if self.record.items:
+            for item in self.record.items:
+                msg += f'\n\t{item}'
         else:
             msg += f'\n\t[No ingredients]'
 
@@ -17,41 +17,28 @@
 #
 # SPDX-License-Identifier: GPL-3.0-or-later
 
-from gi.repository import Adw, Gtk, GLib
-from typing import Callable, List
+from gi.repository import Adw, Gtk, Gio, GObject, Pango
+from typing import Callable
 from scrummy import PREFIX
-from scrummy.meal import Meal, Ingredient
-
-def create_row(meal: Meal, current_meal: Meal) -> Adw.ActionRow:
-    row = Adw.ActionRow()
-    row.set_title(meal.get_title())
-    row.set_use_underline(True)
-
-    radio_button = Gtk.CheckButton()
-    radio_button.set_valign(Gtk.Align.CENTER)
-
-    row.add_prefix(radio_button)
-    row.set_activatable_widget(radio_button)
-
-    row.set_sensitive(meal != current_meal)
-
-    return row
+from scrummy.shared import load_dialog_resources
+from scrummy.meal import Meal
 
+# The template is in a separate resource bundle, loaded on first use.
+load_dialog_resources()
 
 @Gtk.Template(resource_path=f"{PREFIX}/move_to_dialog.ui")
 class MoveToDialog(Adw.Dialog):
     """ A dialog to move an ingredient into another meal """
     __gtype_name__ = "MoveToDialog"
 
-    main_page = Gtk.Template.Child()
     move_btn = Gtk.Template.Child()
-    
-    # TODO: add search functionality
+    meals_selection = Gtk.Template.Child()
+    meals_filter_model = Gtk.Template.Child()
 
     def __init__(
         self,
         on_submit: Callable[[Meal], None],
-        all_meals: List[Meal],
+        all_meals: Gio.ListModel,
         current_meal: Meal,
         **kwargs
     ):
@@ -60,46 +47,67 @@ class MoveToDialog(Adw.Dialog):
         if len(all_meals) < 2:
             raise Exception("This dialog should not be called when there's less than 2 meals!")
 
-        group = Adw.PreferencesGroup()
-        initial_radio_btn = None
+        self.current_meal = current_meal
+        self.on_submit = on_submit
 
-        for meal in all_meals:        
-            row = Adw.ActionRow()
-            row.set_title(meal.get_title())
+        # The meals are shown straight from the sidebar's model.
+        self.meals_filter_model.set_model(all_meals)
 
-            radio_button = Gtk.CheckButton()
-            radio_button.set_valign(Gtk.Align.CENTER)
-            
-            radio_button.connect("toggled", self.set_selected_meal)
-            
-            if initial_radio_btn:
-                radio_button.set_group(initial_radio_btn)
-            else:
-                initial_radio_btn = radio_button
+    @Gtk.Template.Callback()
+    def on_meal_setup(
+        self,
+        factory: Gtk.SignalListItemFactory,
+        list_item: Gtk.ListItem
+    ) -> None:
+        box = Gtk.Box(spacing=12)
+
+        label = Gtk.Label(
+            xalign=0.0,
+            hexpand=True,
+            ellipsize=Pango.EllipsizeMode.END
+        )
+        box.append(label)
+
+        check_icon = Gtk.Image(icon_name="object-select-symbolic")
+        list_item.bind_property(
+            "selected",
+            check_icon,
+            "visible",
+            GObject.BindingFlags.SYNC_CREATE
+        )
+        box.append(check_icon)
+
+        list_item.set_child(box)
 
-            row.add_prefix(radio_button)
-            row.set_activatable_widget(radio_button)
-                
-            row.set_sensitive(meal != current_meal)
+    @Gtk.Template.Callback()
+    def on_meal_bind(
+        self,
+        factory: Gtk.SignalListItemFactory,
+        list_item: Gtk.ListItem
+    ) -> None:
+        meal = list_item.get_item()
+        box = list_item.get_child()
 
-            group.add(row)
+        box.get_first_child().set_text(meal.get_title())
 
-        self.main_page.add(group)
+        # Items can't be moved to the meal they are already in.
+        can_select = meal != self.current_meal
+        list_item.set_selectable(can_select)
+        list_item.set_activatable(can_select)
+        box.set_sensitive(can_select)
 
-        self.selected_meal = None
-        self.all_meals = all_meals
-        self.on_submit = on_submit
-        
-    def set_selected_meal(self, check_button: Gtk.CheckButton) -> None:
-        if not check_button.get_active():
-            # Don't do anything if check button has been *unchecked*.
-            return
-        
-        action_row = check_button.get_ancestor(Adw.ActionRow)
-        index = action_row.get_index()
-        
-        self.selected_meal = self.all_meals[index]
-        self.move_btn.set_sensitive(True)
+    @Gtk.Template.Callback()
+    def on_selection_changed(
+        self,
+        selection: Gtk.SingleSelection,
+        pspec: GObject.ParamSpec
+    ) -> None:
+        self.move_btn.set_sensitive(selection.get_selected_item() is not None)
+
+    @Gtk.Template.Callback()
+    def on_meal_activated(self, list_view: Gtk.ListView, position: int) -> None:
+        self.meals_selection.set_selected(position)
+        self.submit(list_view)
 
     @Gtk.Template.Callback()
     def cancel(self, widget: Gtk.Widget) -> None:
@@ -107,5 +115,5 @@ class MoveToDialog(Adw.Dialog):
 
     @Gtk.Template.Callback()
     def submit(self, widget: Gtk.Widget) -> None:
-        self.on_submit(self.selected_meal)
+        self.on_submit(self.meals_selection.get_selected_item())
         self.close()
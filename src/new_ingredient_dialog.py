@@ -20,6 +20,12 @@
 from gi.repository import Adw, Gtk, GLib, GObject
 from typing import Callable, Optional
 from scrummy import PREFIX
+from scrummy.shared import (
+    date_from_day,
+    day_from_date,
+    load_dialog_resources,
+    parse_date
+)
 
 def default_date() -> GLib.DateTime:
     date = GLib.DateTime.new_now_local()
@@ -48,6 +54,9 @@ class RubberBandDirection:
     BACKWARDS = 0
     FORWARDS = 1
 
+# The template is in a separate resource bundle, loaded on first use.
+load_dialog_resources()
+
 @Gtk.Template(resource_path=f"{PREFIX}/new_ingredient_dialog.ui")
 class NewIngredientDialog(Adw.Dialog):
     """ A dialog to enter details about an ingredient """
@@ -61,9 +70,9 @@ class NewIngredientDialog(Adw.Dialog):
 
     def __init__(
         self,
-        on_submit: Callable[[str, GLib.DateTime], None],
+        on_submit: Callable[[str, Optional[int]], None],
         existing_name: str=None,
-        existing_date: Optional[GLib.DateTime]=None,
+        existing_day: Optional[int]=None,
         **kwargs
     ):
         super().__init__(**kwargs)
@@ -76,37 +85,13 @@ class NewIngredientDialog(Adw.Dialog):
 
         self.name_row.set_text(existing_name if existing_name else "")
 
-        self.switch_row.set_active(existing_date is not None)
-        self.set_date_entry(existing_date if existing_date else default_date())
+        self.switch_row.set_active(existing_day is not None)
+        self.set_date_entry(
+            date_from_day(existing_day) if existing_day else default_date()
+        )
 
     def parse_date_entry(self) -> GLib.DateTime:
-        parsed_date = GLib.Date.new()
-        parsed_date.set_parse(self.date_row.get_text())
-
-        if parsed_date.valid():
-            current_year = GLib.DateTime.new_now_local().get_year()
-            entered_year = parsed_date.get_year()
-
-            entry_remainder = entered_year % 100
-
-            range_end = current_year + 50
-
-            century_remainder = range_end % 100
-            carry = 0 if entry_remainder < century_remainder else 1
-            century = (range_end // 100 - carry) * 100
-
-            corrected_year = century + entry_remainder
-
-            return GLib.DateTime.new_local(
-                corrected_year,
-                parsed_date.get_month(),
-                parsed_date.get_day(),
-                0,
-                0,
-                0.0
-            )
-        else:
-            return default_date()
+        return parse_date(self.date_row.get_text()) or default_date()
 
     def set_date_entry(self, date: GLib.DateTime) -> None:
         self.date_row.set_text(date.format('%x'))
@@ -194,9 +179,9 @@ class NewIngredientDialog(Adw.Dialog):
         name = self.name_row.get_text()
 
         date_set = self.switch_row.get_active()
-        bb_date = self.parse_date_entry() if date_set else None
+        bb_day = day_from_date(self.parse_date_entry()) if date_set else None
 
-        self.on_submit(name, bb_date)
+        self.on_submit(name, bb_day)
         self.close()
 
     @Gtk.Template.Callback()
@@ -20,6 +20,10 @@
 from gi.repository import Adw, Gtk, GLib
 from typing import Callable
 from scrummy import PREFIX
+from scrummy.shared import load_dialog_resources
+
+# The template is in a separate resource bundle, loaded on first use.
+load_dialog_resources()
 
 @Gtk.Template(resource_path=f"{PREFIX}/new_meal_dialog.ui")
 class NewMealDialog(Adw.Dialog):
@@ -0,0 +1,355 @@
+# pantry.py
+#
+# Copyright 2025 Wartybix
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <https://www.gnu.org/licenses/>.
+#
+# SPDX-License-Identifier: GPL-3.0-or-later
+
+import locale
+from collections import Counter
+from bisect import bisect_left, bisect_right
+from heapq import merge
+from operator import attrgetter
+from typing import Dict, Iterable, List, Optional, Tuple
+from scrummy.date_labels import format_day
+from scrummy.instrumentation import traced
+
+# Plain data records for the pantry. These hold no widgets, actions or signal
+# connections, so a meal with thousands of items only costs a Python list of
+# small objects. Widgets are built from them only when they are shown.
+#
+# Records are ordered by sort keys worked out once, when they are created or
+# renamed: tuples of plain Python values, so sorting and bisecting never call
+# into GLib.
+#
+# Dates are day numbers (proleptic Gregorian ordinals, as in
+# datetime.date.toordinal()), which name a calendar day whatever the time
+# zone. They are only turned into GLib.DateTime to be shown (see
+# date_labels.py).
+
+def get_title_key(title: str) -> str:
+    """ Gets a key that sorts titles in the order of the user's locale """
+    return locale.strxfrm(title)
+
+class FoodItem:
+    """ A single food item / ingredient """
+    # Items aren't changed once they are in a meal. Edits replace the item, so
+    # other holders of it (e.g. a save running in the background) aren't
+    # affected.
+    __slots__ = ('title', 'frozen', 'sort_key')
+
+    def __init__(
+        self,
+        title: str,
+        bb_day: Optional[int]=None,
+        frozen: bool=False
+    ):
+        self.title = title
+        self.frozen = frozen
+
+        # Undated items come first.
+        self.sort_key = (bb_day or 0, get_title_key(title))
+
+    @property
+    def bb_day(self) -> Optional[int]:
+        """ The day number of the item's date, or None if undated """
+        return self.sort_key[0] or None
+
+    def copy(self) -> 'FoodItem':
+        # Reuses the sort key, rather than transforming the title again.
+        item = FoodItem.__new__(FoodItem)
+        item.title = self.title
+        item.frozen = self.frozen
+        item.sort_key = self.sort_key
+
+        return item
+
+    def __str__(self):
+        bb_day = self.bb_day
+        bb_msg = f"exp. {format_day(bb_day)}" if bb_day else "undated"
+
+        return f"{self.title} ({bb_msg}) -- {'un' if not self.frozen else ''}frozen"
+
+food_item_key = attrgetter('sort_key')
+
+def count_titles_by_day(items: Iterable[FoodItem]) -> Dict[int, Counter]:
+    """ Counts the titles of dated items, for each day they are due """
+    counts = {}
+
+    for item in items:
+        day = item.bb_day
+
+        if day:
+            titles = counts.get(day)
+
+            if titles is None:
+                titles = counts[day] = Counter()
+
+            titles[item.title] += 1
+
+    return counts
+
+class MealRecord:
+    """ A meal (or the unsorted food list) and its sorted food items """
+    __slots__ = (
+        'id',
+        '_title',
+        'title_key',
+        'misc',
+        'items',
+        'shared',
+        'shares_items',
+        'day_counts'
+    )
+
+    # Copies of a record share its item list until either of them changes it
+    # (copy-on-write), so duplicating a meal or snapshotting the pantry doesn't
+    # copy any lists. Items themselves are never changed, so copies share them
+    # too. Item lists are changed only through the methods below, which first
+    # take a private copy of a shared list.
+    #
+    # Items are told apart by identity, so a meal must never hold the same item
+    # twice. A duplicated meal holds the same items as the original, so one of
+    # them could be moved back into the other; distinct_items() copies such
+    # items before they are added.
+
+    def __init__(
+        self,
+        title: str="",
+        misc: bool=False,
+        items: Optional[List[FoodItem]]=None,
+        id: int=0
+    ):
+        # Identifies the meal in pantry files. The unsorted food list is 0.
+        self.id = id
+        self.title = title
+        self.misc = misc
+        self.items = items if items is not None else []
+        self.shared = False
+
+        # Whether another meal may hold some of the same items.
+        self.shares_items = False
+
+        # Cache of count_titles_by_day() for the items, shared with copies.
+        self.day_counts = None
+
+        self.items.sort(key=food_item_key)
+
+    @property
+    def title(self) -> str:
+        return self._title
+
+    @title.setter
+    def title(self, title: str) -> None:
+        self._title = title
+        self.title_key = get_title_key(title)
+
+    @traced
+    def insert(self, item: FoodItem) -> int:
+        """ Inserts an item in sorted order, returning its position """
+        items = self.own_items()
+        position = bisect_right(items, item.sort_key, key=food_item_key)
+        items.insert(position, item)
+
+        return position
+
+    def remove(self, item: FoodItem) -> int:
+        """ Removes an item, returning the position it was removed from """
+        position = self.index(item)
+        del self.own_items()[position]
+
+        return position
+
+    @traced
+    def insert_many(self, items: Iterable[FoodItem]) -> Tuple[int, int, int]:
+        """ Merges items into the sorted list in one pass.
+
+        Returns the changed range as (position, removed, added), the way a
+        list model splice describes it.
+        """
+        new_items = sorted(items, key=food_item_key)
+
+        if not new_items:
+            return 0, 0, 0
+
+        start = bisect_left(
+            self.items,
+            new_items[0].sort_key,
+            key=food_item_key
+        )
+        end = bisect_right(
+            self.items,
+            new_items[-1].sort_key,
+            key=food_item_key
+        )
+
+        items = self.own_items()
+        items[start:end] = merge(
+            items[start:end],
+            new_items,
+            key=food_item_key
+        )
+
+        return start, end - start, end - start + len(new_items)
+
+    @traced
+    def remove_many(self, items: Iterable[FoodItem]) -> Tuple[int, int, int]:
+        """ Removes items in one pass.
+
+        Returns the changed range as (position, removed, added), the way a
+        list model splice describes it.
+        """
+        positions = set(map(self.index, items))
+
+        if not positions:
+            return 0, 0, 0
+
+        start = min(positions)
+        end = max(positions) + 1
+
+        kept_items = [
+            self.items[position] for position in range(start, end)
+            if position not in positions
+        ]
+
+        self.own_items()[start:end] = kept_items
+
+        return start, end - start, len(kept_items)
+
+    @traced
+    def replace_many(
+        self,
+        old_items: Iterable[FoodItem],
+        new_items: Iterable[FoodItem]
+    ) -> Tuple[int, int, int]:
+        """ Removes some items and inserts others, as one change.
+
+        Returns a range covering both changes as (position, removed, added).
+        """
+        r_start, r_removed, r_added = self.remove_many(old_items)
+        a_start, a_removed, a_added = self.insert_many(new_items)
+
+        if not r_removed:
+            return a_start, a_removed, a_added
+        elif not a_added:
+            return r_start, r_removed, r_added
+
+        # Combine the two ranges, in terms of the list after the removal.
+        start = min(r_start, a_start)
+        end = max(r_start + r_added, a_start + a_removed)
+
+        return (
+            start,
+            end - start + r_removed - r_added,
+            end - start + a_added - a_removed
+        )
+
+    def index(self, item: FoodItem) -> int:
+        items = self.items
+        sort_key = item.sort_key
+        start = bisect_left(items, sort_key, key=food_item_key)
+
+        # Compare by identity, as duplicated items are equal in value. They
+        # share a sort key, so only that run of items needs checking.
+        for position in range(start, len(items)):
+            other = items[position]
+
+            if other is item:
+                return position
+            elif other.sort_key != sort_key:
+                break
+
+        raise ValueError(f"{item} is not in meal '{self.title}'")
+
+    def sort(self) -> None:
+        self.own_items().sort(key=food_item_key)
+
+    def set_items(self, items: List[FoodItem]) -> None:
+        """ Replaces every item, taking ownership of the list """
+        self.items = items
+        self.shared = False
+        self.day_counts = None
+
+        self.sort()
+
+    def own_items(self) -> List[FoodItem]:
+        """ Gets the item list for changing, copying it first if shared """
+        if self.shared:
+            # The other records sharing the list keep it as it is. They still
+            # count it as shared, so they may copy it needlessly later, but
+            # this avoids tracking every record sharing a list.
+            self.items = list(self.items)
+            self.shared = False
+
+        self.day_counts = None
+
+        return self.items
+
+    def holds(self, item: FoodItem) -> bool:
+        """ Whether this very item (not just an equal one) is in the meal """
+        try:
+            self.index(item)
+        except ValueError:
+            return False
+
+        return True
+
+    def distinct_items(self, items: List[FoodItem]) -> List[FoodItem]:
+        """ Gets items to add to the meal, copying any it already holds """
+        if not self.shares_items:
+            return items
+
+        return [item.copy() if self.holds(item) else item for item in items]
+
+    def get_day_counts(self) -> Dict[int, Counter]:
+        """ Counts the titles of the dated items, for each day they are due.
+
+        The counts are cached until the items change. They must not be
+        changed, as copies of the record share them.
+        """
+        if self.day_counts is None:
+            self.day_counts = count_titles_by_day(self.items)
+
+        return self.day_counts
+
+    def copy(self) -> 'MealRecord':
+        """ Copies the record, sharing its item list until either changes it """
+        record = MealRecord(self.title, self.misc, id=self.id)
+        record.items = self.items
+        record.shared = self.shared = True
+        record.shares_items = self.shares_items
+        record.day_counts = self.day_counts
+
+        return record
+
+    def duplicate(self, id: int) -> 'MealRecord':
+        """ Copies the record as a new meal, sharing its items """
+        record = self.copy()
+        record.id = id
+        record.shares_items = self.shares_items = True
+
+        return record
+
+    def get_bb_day(self) -> Optional[int]:
+        """ Gets the earliest day of the items, or None if any are undated """
+        # Items are kept sorted with undated ones first, so this is always the
+        # first item's day, and nothing has to be recalculated on changes.
+        if not self.items:
+            return None
+
+        return self.items[0].bb_day
+
+    def __len__(self):
+        return len(self.items)
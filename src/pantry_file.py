@@ -0,0 +1,161 @@
+# pantry_file.py
+#
+# Copyright 2025 Wartybix
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <https://www.gnu.org/licenses/>.
+#
+# SPDX-License-Identifier: GPL-3.0-or-later
+
+import datetime
+import json
+from typing import Iterable, List, Tuple
+from scrummy.pantry import FoodItem, MealRecord
+
+# A pantry file is UTF-8 JSON lines. The first line is a header naming the
+# format, its version and the generation of the snapshot (see
+# pantry_journal.py). Every following line is a short array:
+#
+#   ["u"]                          start of the unsorted food list
+#   ["m", id, title]               start of a meal
+#   ["i", title, day, frozen]      food item in the list/meal above it
+#
+# 'day' is a proleptic Gregorian ordinal, or null when undated. Items are
+# written in sorted order, so loading doesn't have to reorder them.
+#
+# Version 1 files had no generation, and no ids in meal lines.
+
+FORMAT_NAME = "scrummy-pantry"
+FORMAT_VERSION = 2
+
+UNSORTED_TAG = "u"
+MEAL_TAG = "m"
+ITEM_TAG = "i"
+
+# Last day that can be shown as a date.
+MAX_DAY = datetime.date.max.toordinal()
+
+class PantryFileError(Exception):
+    """ Raised when a pantry file can't be read """
+
+def item_to_json(item: FoodItem) -> list:
+    return [item.title, item.bb_day, int(item.frozen)]
+
+def is_int(value) -> bool:
+    # JSON booleans are ints in Python, so are rejected separately.
+    return isinstance(value, int) and not isinstance(value, bool)
+
+def item_from_json(value: list) -> FoodItem:
+    title, day, frozen = value
+
+    if day is not None and (not is_int(day) or not 1 <= day <= MAX_DAY):
+        raise ValueError(f"Invalid day {day!r}")
+
+    return FoodItem(title, day, bool(frozen))
+
+def item_to_line(item: FoodItem) -> str:
+    return json.dumps([ITEM_TAG] + item_to_json(item), ensure_ascii=False)
+
+def write_pantry(
+    unsorted_food: MealRecord,
+    meals: Iterable[MealRecord],
+    generation: int=0
+) -> bytes:
+    """ Serialises the whole pantry to the bytes of a pantry file """
+    header = {
+        "format": FORMAT_NAME,
+        "version": FORMAT_VERSION,
+        "generation": generation
+    }
+    lines = [json.dumps(header), json.dumps([UNSORTED_TAG])]
+    lines.extend(map(item_to_line, unsorted_food.items))
+
+    for meal in meals:
+        lines.append(
+            json.dumps([MEAL_TAG, meal.id, meal.title], ensure_ascii=False)
+        )
+        lines.extend(map(item_to_line, meal.items))
+
+    lines.append("")
+
+    return "\n".join(lines).encode("utf-8")
+
+def read_pantry(data: bytes) -> Tuple[int, MealRecord, List[MealRecord]]:
+    """ Parses the bytes of a pantry file.
+
+    Returns the generation of the snapshot, the record of the unsorted food
+    list, and the records of every meal.
+    """
+    try:
+        lines = data.decode("utf-8").splitlines()
+    except UnicodeDecodeError as e:
+        raise PantryFileError("Not a UTF-8 file") from e
+
+    if not lines:
+        raise PantryFileError("File is empty")
+
+    try:
+        header = json.loads(lines[0])
+    except json.JSONDecodeError as e:
+        raise PantryFileError("Missing file header") from e
+
+    if not isinstance(header, dict) or header.get("format") != FORMAT_NAME:
+        raise PantryFileError("Not a pantry file")
+
+    version = header.get("version", 0)
+    generation = header.get("generation", 0)
+
+    if not is_int(version) or not is_int(generation):
+        raise PantryFileError("Invalid file header")
+
+    if version > FORMAT_VERSION:
+        raise PantryFileError(f"Unsupported pantry file version {version}")
+
+    unsorted_food = MealRecord(misc=True)
+    meals = []
+    items = None
+
+    decode = json.JSONDecoder().decode
+
+    for line_number, line in enumerate(lines[1:], start=2):
+        if not line:
+            continue
+
+        try:
+            record = decode(line)
+            tag = record[0]
+
+            if tag == ITEM_TAG:
+                items.append(item_from_json(record[1:]))
+            elif tag == MEAL_TAG:
+                if version < 2:
+                    meal = MealRecord(record[1], id=len(meals) + 1)
+                else:
+                    meal = MealRecord(record[2], id=record[1])
+
+                meals.append(meal)
+                items = meal.items
+            elif tag == UNSORTED_TAG:
+                items = unsorted_food.items
+            else:
+                raise ValueError(f"Unknown record type {tag!r}")
+        except (ValueError, TypeError, IndexError, AttributeError) as e:
+            raise PantryFileError(f"Invalid record on line {line_number}") from e
+
+    # Items are stored in order, but sort anyway in case the file was edited
+    # by hand. Sorting already sorted lists is linear.
+    unsorted_food.sort()
+    for meal in meals:
+        meal.sort()
+
+    return generation, unsorted_food, meals
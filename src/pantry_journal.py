@@ -0,0 +1,496 @@
+# pantry_journal.py
+#
+# Copyright 2025 Wartybix
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <https://www.gnu.org/licenses/>.
+#
+# SPDX-License-Identifier: GPL-3.0-or-later
+
+import json
+import logging
+import os
+import queue
+import threading
+from bisect import bisect_left
+from gi.repository import GLib
+from typing import Callable, Dict, List, Optional, TextIO, Tuple
+from scrummy.pantry import FoodItem, MealRecord, food_item_key
+from scrummy.pantry_file import item_to_json, item_from_json, write_pantry
+from scrummy.pantry_search import (
+    SEARCH_INDEX_HEADER,
+    get_search_index_path,
+    get_search_records
+)
+
+# Changes to an open pantry are appended to a journal file next to it (e.g.
+# 'meals.scrummy.journal') rather than rewriting the whole pantry file. The
+# journal is written on a background thread, and once it grows long enough
+# the same thread compacts it: the pantry file is rewritten as a new snapshot
+# and the journal is started again.
+#
+# Both files carry a generation number. A journal only applies to the
+# snapshot of the same generation, so if the app stops between writing a new
+# snapshot and starting the new journal, the old journal is ignored rather
+# than replayed twice.
+#
+# The journal is UTF-8 JSON lines: a header, then one change per line.
+#
+# The search index used by the desktop search is rewritten by the same thread,
+# shortly after each group of changes. The thread keeps the index records of
+# every meal, so only the meals changed since the last write are copied to it.
+
+JOURNAL_FORMAT_NAME = "scrummy-journal"
+JOURNAL_FORMAT_VERSION = 1
+JOURNAL_SUFFIX = ".journal"
+
+# Number of changes after which the journal is compacted into the pantry file.
+COMPACT_THRESHOLD = 500
+
+ADD_ITEMS = "add"                   # ["add", meal id, [items]]
+REMOVE_ITEMS = "remove"             # ["remove", meal id, [items]]
+REPLACE_ITEM = "replace"            # ["replace", meal id, old item, new item]
+ADD_MEAL = "add_meal"               # ["add_meal", meal id, title]
+RENAME_MEAL = "rename_meal"         # ["rename_meal", meal id, title]
+REMOVE_MEAL = "remove_meal"         # ["remove_meal", meal id]
+DUPLICATE_MEAL = "duplicate_meal"   # ["duplicate_meal", source id, meal id]
+
+logger = logging.getLogger(__name__)
+
+CHANGE_TASK = 0
+COMPACT_TASK = 1
+CLOSE_TASK = 2
+SEARCH_INDEX_TASK = 3
+
+def get_journal_path(pantry_path: str) -> str:
+    return pantry_path + JOURNAL_SUFFIX
+
+def write_file_atomically(path: str, data: bytes) -> None:
+    temp_path = path + ".tmp"
+
+    with open(temp_path, "wb") as file:
+        file.write(data)
+        file.flush()
+        os.fsync(file.fileno())
+
+    os.replace(temp_path, path)
+
+def find_items(meal: MealRecord, values: List[list]) -> List[FoodItem]:
+    """ Finds distinct items in a meal from their JSON values """
+    items = meal.items
+    found = []
+    found_ids = set()
+
+    for value in values:
+        wanted = item_from_json(value)
+        sort_key = wanted.sort_key
+        position = bisect_left(items, sort_key, key=food_item_key)
+
+        # Items equal in value share a sort key, so only that run of items
+        # needs checking.
+        while position < len(items) and items[position].sort_key == sort_key:
+            item = items[position]
+
+            if (
+                item.title == wanted.title
+                and item.frozen == wanted.frozen
+                and id(item) not in found_ids
+            ):
+                found.append(item)
+                found_ids.add(id(item))
+                break
+
+            position += 1
+        else:
+            raise KeyError(f"No item {value} in meal {meal.id}")
+
+    return found
+
+def apply_change(meals: Dict[int, MealRecord], change: list) -> None:
+    kind = change[0]
+
+    if kind == ADD_ITEMS:
+        _kind, meal_id, values = change
+        meals[meal_id].insert_many(map(item_from_json, values))
+    elif kind == REMOVE_ITEMS:
+        _kind, meal_id, values = change
+        meal = meals[meal_id]
+        meal.remove_many(find_items(meal, values))
+    elif kind == REPLACE_ITEM:
+        _kind, meal_id, old_value, new_value = change
+        meal = meals[meal_id]
+        meal.remove_many(find_items(meal, [old_value]))
+        meal.insert(item_from_json(new_value))
+    elif kind == ADD_MEAL:
+        _kind, meal_id, title = change
+        meals[meal_id] = MealRecord(title, id=meal_id)
+    elif kind == RENAME_MEAL:
+        _kind, meal_id, title = change
+        meals[meal_id].title = title
+    elif kind == REMOVE_MEAL:
+        _kind, meal_id = change
+        del meals[meal_id]
+    elif kind == DUPLICATE_MEAL:
+        _kind, source_id, meal_id = change
+        meals[meal_id] = meals[source_id].duplicate(meal_id)
+    else:
+        raise ValueError(f"Unknown change {kind!r}")
+
+def replay_journal(
+    journal_path: str,
+    generation: int,
+    unsorted_food: MealRecord,
+    meals: List[MealRecord]
+) -> Tuple[List[MealRecord], Optional[int]]:
+    """ Applies the changes in a journal to the records of a pantry snapshot.
+
+    Returns the updated list of meals, and the number of changes replayed.
+    The number is None if there was no journal for this snapshot.
+    """
+    try:
+        # Lines are decoded one by one, with the JSON, so a line cut short
+        # by a crash is treated like one with invalid JSON.
+        with open(journal_path, "rb") as file:
+            lines = file.read().splitlines()
+    except FileNotFoundError:
+        return meals, None
+
+    try:
+        header = json.loads(lines[0])
+    except (IndexError, ValueError):
+        return meals, None
+
+    if (
+        not isinstance(header, dict)
+        or header.get("format") != JOURNAL_FORMAT_NAME
+        or header.get("generation") != generation
+    ):
+        # The journal's changes are already part of the snapshot.
+        return meals, None
+
+    meals_by_id = {meal.id: meal for meal in meals}
+    meals_by_id[0] = unsorted_food
+    num_changes = 0
+
+    for line in lines[1:]:
+        try:
+            change = json.loads(line)
+        except ValueError:
+            # The last change may have been cut short by a crash.
+            break
+
+        try:
+            apply_change(meals_by_id, change)
+        except (KeyError, ValueError, TypeError) as e:
+            logger.warning("Skipping journal change %s: %s", change, e)
+
+        num_changes += 1
+
+    del meals_by_id[0]
+
+    return list(meals_by_id.values()), num_changes
+
+class PantryJournal():
+    """ Records changes to a pantry in its journal, in the background """
+
+    def __init__(
+        self,
+        pantry_path: str,
+        generation: int,
+        get_state: Callable[[], Tuple[MealRecord, List[MealRecord]]],
+        on_error: Callable[[str], None],
+        num_changes: Optional[int]=None
+    ):
+        self.pantry_path = pantry_path
+        self.journal_path = get_journal_path(pantry_path)
+        self.generation = generation
+        self.get_state = get_state
+        self.on_error = on_error
+        self.num_changes = num_changes or 0
+
+        # Idle callback compacting the journal once it grows long enough.
+        self.compact_source = None
+
+        # Idle callback rewriting the search index after changes.
+        self.search_index_source = None
+
+        # Ids of the meals changed since the search index was last written,
+        # or None if the journal thread doesn't have every meal yet.
+        self.stale_meal_ids = None
+
+        # Search index records of each meal, in order. Only used by the
+        # journal thread.
+        self.search_records: Dict[int, bytes] = {}
+
+        self.tasks = queue.SimpleQueue()
+        self.thread = threading.Thread(
+            target=self.run,
+            name="pantry-journal",
+            daemon=True
+        )
+        self.thread.start()
+
+        if num_changes != 0:
+            # Fold recovered changes into the pantry file, or start a journal
+            # if there isn't a usable one.
+            self.compact()
+
+    def add_items(self, meal: MealRecord, items: List[FoodItem]) -> None:
+        self.append([ADD_ITEMS, meal.id, list(items)])
+
+    def remove_items(self, meal: MealRecord, items: List[FoodItem]) -> None:
+        self.append([REMOVE_ITEMS, meal.id, list(items)])
+
+    def replace_item(
+        self,
+        meal: MealRecord,
+        old_item: FoodItem,
+        new_item: FoodItem
+    ) -> None:
+        self.append([REPLACE_ITEM, meal.id, old_item, new_item])
+
+    def add_meal(self, meal: MealRecord) -> None:
+        self.append([ADD_MEAL, meal.id, meal.title])
+
+    def rename_meal(self, meal: MealRecord) -> None:
+        self.append([RENAME_MEAL, meal.id, meal.title])
+
+    def remove_meal(self, meal: MealRecord) -> None:
+        self.append([REMOVE_MEAL, meal.id])
+
+    def duplicate_meal(self, source: MealRecord, meal: MealRecord) -> None:
+        self.append([DUPLICATE_MEAL, source.id, meal.id])
+
+    def append(self, change: list) -> None:
+        # Items are serialised on the journal thread. This is safe, as items
+        # aren't changed once they are in a meal.
+        self.tasks.put((CHANGE_TASK, change))
+        self.num_changes += 1
+
+        if self.stale_meal_ids is not None:
+            meal_id = change[2] if change[0] == DUPLICATE_MEAL else change[1]
+            self.stale_meal_ids.add(meal_id)
+
+        # Compact once the current operation is over, as it may append more
+        # changes for state that the snapshot would already include.
+        if (
+            self.num_changes >= COMPACT_THRESHOLD
+            and self.compact_source is None
+        ):
+            self.compact_source = GLib.idle_add(self.on_compact_idle)
+        elif self.search_index_source is None:
+            self.search_index_source = GLib.idle_add(
+                self.on_search_index_idle
+            )
+
+    def on_compact_idle(self) -> bool:
+        self.compact_source = None
+        self.compact()
+
+        return GLib.SOURCE_REMOVE
+
+    def on_search_index_idle(self) -> bool:
+        self.search_index_source = None
+
+        unsorted_food, meals = self.get_state()
+        records = [unsorted_food, *meals]
+        stale_meal_ids = self.stale_meal_ids
+        self.stale_meal_ids = set()
+
+        # Copying a record makes its next change copy the item list, so only
+        # the changed meals are copied.
+        self.tasks.put((
+            SEARCH_INDEX_TASK,
+            [record.id for record in records],
+            [
+                record.copy() for record in records
+                if stale_meal_ids is None or record.id in stale_meal_ids
+            ]
+        ))
+
+        return GLib.SOURCE_REMOVE
+
+    def copy_state(self) -> Tuple[MealRecord, List[MealRecord]]:
+        unsorted_food, meals = self.get_state()
+
+        # Copy the records. Their item lists are shared until the main thread
+        # changes them, which then copies a list of its own.
+        return unsorted_food.copy(), [meal.copy() for meal in meals]
+
+    def cancel_idle(self) -> None:
+        for source in (self.compact_source, self.search_index_source):
+            if source is not None:
+                GLib.source_remove(source)
+
+        self.compact_source = None
+        self.search_index_source = None
+
+    def compact(self) -> None:
+        """ Writes the current pantry as a new snapshot, in the background """
+        # The snapshot includes a new search index too.
+        self.cancel_idle()
+
+        self.generation += 1
+        self.num_changes = 0
+        self.stale_meal_ids = set()
+
+        self.tasks.put((COMPACT_TASK, self.generation, *self.copy_state()))
+
+    def close(self) -> None:
+        """ Compacts any outstanding changes, and waits for them to be saved """
+        if self.num_changes:
+            self.compact()
+        else:
+            self.cancel_idle()
+
+        self.tasks.put((CLOSE_TASK,))
+        self.thread.join()
+
+    def run(self) -> None:
+        journal_file = None
+
+        if os.path.exists(self.journal_path):
+            journal_file = open(self.journal_path, "a", encoding="utf-8")
+
+        while True:
+            # Handle everything queued up at once, so a burst of changes is
+            # written and synced together.
+            tasks = [self.tasks.get()]
+
+            try:
+                while True:
+                    tasks.append(self.tasks.get_nowait())
+            except queue.Empty:
+                pass
+
+            closing = False
+            error = None
+
+            # Only the last of the search indexes queued needs writing, once
+            # the records of every queued one are taken in.
+            last_index_task = max(
+                (
+                    i for i, task in enumerate(tasks)
+                    if task[0] in (COMPACT_TASK, SEARCH_INDEX_TASK)
+                ),
+                default=-1
+            )
+
+            try:
+                for i, task in enumerate(tasks):
+                    if task[0] == CLOSE_TASK:
+                        closing = True
+                        continue
+
+                    # Carry on with the rest of the batch after an error, so
+                    # a later snapshot or close isn't lost.
+                    try:
+                        if task[0] == CHANGE_TASK:
+                            journal_file.write(self.serialize_change(task[1]))
+                        elif task[0] == COMPACT_TASK:
+                            if journal_file:
+                                journal_file.close()
+                                journal_file = None
+
+                            journal_file = self.write_snapshot(*task[1:])
+                        elif task[0] == SEARCH_INDEX_TASK:
+                            self.update_search_records(*task[1:])
+
+                            if i == last_index_task:
+                                self.write_search_index()
+                    except (OSError, ValueError, AttributeError) as e:
+                        error = error or e
+
+                try:
+                    if journal_file:
+                        journal_file.flush()
+                        os.fsync(journal_file.fileno())
+                except (OSError, ValueError) as e:
+                    error = error or e
+
+                if error:
+                    GLib.idle_add(self.on_error, str(error))
+            finally:
+                # close() waits for the thread, so always stop when asked.
+                if closing and journal_file:
+                    try:
+                        journal_file.close()
+                    except OSError:
+                        pass
+
+            if closing:
+                return
+
+    def serialize_change(self, change: list) -> str:
+        values = []
+
+        for value in change:
+            if isinstance(value, FoodItem):
+                value = item_to_json(value)
+            elif isinstance(value, list):
+                value = [item_to_json(item) for item in value]
+
+            values.append(value)
+
+        return json.dumps(values, ensure_ascii=False) + "\n"
+
+    def write_snapshot(
+        self,
+        generation: int,
+        unsorted_food: MealRecord,
+        meals: List[MealRecord]
+    ) -> TextIO:
+        records = [unsorted_food, *meals]
+
+        # Taken in first, so the records stay complete even if a write fails.
+        self.update_search_records([record.id for record in records], records)
+
+        write_file_atomically(
+            self.pantry_path,
+            write_pantry(unsorted_food, meals, generation)
+        )
+
+        self.write_search_index()
+
+        header = {
+            "format": JOURNAL_FORMAT_NAME,
+            "version": JOURNAL_FORMAT_VERSION,
+            "generation": generation
+        }
+        write_file_atomically(
+            self.journal_path,
+            (json.dumps(header) + "\n").encode("utf-8")
+        )
+
+        return open(self.journal_path, "a", encoding="utf-8")
+
+    def update_search_records(
+        self,
+        meal_ids: List[int],
+        changed_meals: List[MealRecord]
+    ) -> None:
+        """ Replaces the search index records of changed meals """
+        records = self.search_records
+
+        for meal in changed_meals:
+            records[meal.id] = get_search_records(meal)
+
+        # Drops removed meals, and puts the rest in order.
+        self.search_records = {meal_id: records[meal_id] for meal_id in meal_ids}
+
+    def write_search_index(self) -> None:
+        # For the desktop search, which reads it without loading the pantry.
+        write_file_atomically(
+            get_search_index_path(self.pantry_path),
+            SEARCH_INDEX_HEADER + b"".join(self.search_records.values())
+        )
@@ -0,0 +1,361 @@
+# pantry_search.py
+#
+# Copyright 2025 Wartybix
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <https://www.gnu.org/licenses/>.
+#
+# SPDX-License-Identifier: GPL-3.0-or-later
+
+import logging
+import mmap
+import os
+from collections import Counter
+from gi.repository import Gio, GLib
+from typing import List, Optional
+from scrummy import APPLICATION_ID
+from scrummy.pantry import MealRecord
+from scrummy.date_labels import format_day
+
+# Shortly after the pantry changes, the pantry journal writes a search index
+# next to the pantry file (e.g. 'meals.scrummy.search'). The GNOME Shell search
+# provider answers from it, through a memory map, without reading the pantry.
+#
+# The index is UTF-8 text: a header line, then one line per record:
+#
+#   key <TAB> kind <TAB> title <TAB> meal title <TAB> day <TAB> count
+#
+# 'key' is the case-folded title, which searches are matched against. 'kind'
+# is 'm' for a meal, or 'i' for items (all items of a meal with the same
+# title share a record, with their earliest day and their count).
+#
+# Result IDs are '<file id>:<line offset>', so results can be shown and
+# refined by reading just their own lines.
+
+SEARCH_INDEX_HEADER = b"scrummy-search-index 1\n"
+SEARCH_INDEX_SUFFIX = ".search"
+
+MEAL_KIND = "m"
+ITEMS_KIND = "i"
+
+# Number of results returned to the shell. Refining a search still looks
+# through every match of the previous terms.
+MAX_RESULTS = 50
+
+DBUS_ERROR_FAILED = "org.freedesktop.DBus.Error.Failed"
+
+SEARCH_PROVIDER_XML = """
+<node>
+  <interface name="org.gnome.Shell.SearchProvider2">
+    <method name="GetInitialResultSet">
+      <arg type="as" name="terms" direction="in" />
+      <arg type="as" name="results" direction="out" />
+    </method>
+    <method name="GetSubsearchResultSet">
+      <arg type="as" name="previous_results" direction="in" />
+      <arg type="as" name="terms" direction="in" />
+      <arg type="as" name="results" direction="out" />
+    </method>
+    <method name="GetResultMetas">
+      <arg type="as" name="identifiers" direction="in" />
+      <arg type="aa{sv}" name="metas" direction="out" />
+    </method>
+    <method name="ActivateResult">
+      <arg type="s" name="identifier" direction="in" />
+      <arg type="as" name="terms" direction="in" />
+      <arg type="u" name="timestamp" direction="in" />
+    </method>
+    <method name="LaunchSearch">
+      <arg type="as" name="terms" direction="in" />
+      <arg type="u" name="timestamp" direction="in" />
+    </method>
+  </interface>
+</node>
+"""
+
+logger = logging.getLogger(__name__)
+
+def get_search_index_path(pantry_path: str) -> str:
+    return pantry_path + SEARCH_INDEX_SUFFIX
+
+def clean_field(text: str) -> str:
+    return text.replace("\t", " ").replace("\n", " ")
+
+def get_search_records(meal: MealRecord) -> bytes:
+    """ Serialises the search index records of one meal """
+    lines = []
+    meal_title = clean_field(meal.title)
+
+    if not meal.misc:
+        lines.append("\t".join((
+            meal_title.casefold(), MEAL_KIND, meal_title, "", "", "0"
+        )))
+
+    counts = Counter(item.title for item in meal.items)
+    days = {}
+
+    # Items are sorted, so the first of each title is the earliest.
+    for item in meal.items:
+        days.setdefault(item.title, item.bb_day)
+
+    for title, count in counts.items():
+        title = clean_field(title)
+        lines.append("\t".join((
+            title.casefold(),
+            ITEMS_KIND,
+            title,
+            meal_title,
+            str(days[title] or ""),
+            str(count)
+        )))
+
+    lines.append("")
+
+    return "\n".join(lines).encode("utf-8")
+
+class SearchIndexFile():
+    """ A memory map of the search index of the last opened pantry """
+
+    def __init__(self):
+        self.path = None
+        self.file_id = None
+        self.data = None
+
+    def update(self, path: Optional[str]) -> None:
+        """ Maps the index at a path, unless it is already mapped """
+        try:
+            stat = os.stat(path) if path else None
+        except OSError:
+            stat = None
+
+        file_id = f"{stat.st_ino}-{stat.st_mtime_ns}" if stat else None
+
+        if path == self.path and file_id == self.file_id:
+            return
+
+        if self.data:
+            self.data.close()
+
+        self.path = path
+        self.file_id = file_id
+        self.data = None
+
+        if not stat or not stat.st_size:
+            return
+
+        try:
+            with open(path, "rb") as file:
+                data = mmap.mmap(file.fileno(), 0, access=mmap.ACCESS_READ)
+        except (OSError, ValueError) as e:
+            logger.warning("Could not map search index %s: %s", path, e)
+            return
+
+        if data[:len(SEARCH_INDEX_HEADER)] != SEARCH_INDEX_HEADER:
+            data.close()
+            return
+
+        self.data = data
+
+    def read_record(self, offset: int) -> List[str]:
+        end = self.data.find(b"\n", offset)
+        return self.data[offset:end].decode("utf-8").split("\t")
+
+    def get_offset(self, identifier: str) -> Optional[int]:
+        """ Gets the line offset of a result ID from the mapped file """
+        file_id, _sep, offset = identifier.rpartition(":")
+
+        if not self.data or file_id != self.file_id:
+            return None
+
+        try:
+            offset = int(offset)
+        except ValueError:
+            return None
+
+        if not len(SEARCH_INDEX_HEADER) <= offset < len(self.data):
+            return None
+
+        return offset
+
+    def search(self, terms: List[str]) -> List[str]:
+        terms = [term.casefold() for term in terms if term]
+
+        if not self.data or not terms:
+            return []
+
+        data = self.data
+
+        # Look for the longest term through the map, and check the others on
+        # the lines it is found in.
+        needle = max(terms, key=len).encode("utf-8")
+        results = []
+        position = data.find(needle, len(SEARCH_INDEX_HEADER))
+
+        while position != -1:
+            line_start = data.rfind(b"\n", 0, position) + 1
+            key_end = data.find(b"\t", line_start)
+            line_end = data.find(b"\n", position)
+
+            if position + len(needle) <= key_end:
+                key = data[line_start:key_end].decode("utf-8")
+
+                if all(term in key for term in terms):
+                    results.append(f"{self.file_id}:{line_start}")
+
+            position = data.find(needle, line_end + 1)
+
+        return results
+
+    def refine(self, identifiers: List[str], terms: List[str]) -> List[str]:
+        """ Narrows down previous results, reading only their lines """
+        terms = [term.casefold() for term in terms]
+        results = []
+
+        for identifier in identifiers:
+            offset = self.get_offset(identifier)
+
+            if offset is None:
+                continue
+
+            key = self.read_record(offset)[0]
+
+            if all(term in key for term in terms):
+                results.append(identifier)
+
+        return results
+
+    def get_meta(self, identifier: str) -> Optional[dict]:
+        offset = self.get_offset(identifier)
+
+        if offset is None:
+            return None
+
+        _key, kind, title, meal_title, day, count = self.read_record(offset)
+
+        if kind == MEAL_KIND:
+            description = _("Meal")
+        else:
+            description = meal_title or _("Unsorted Food")
+
+            if day:
+                date = format_day(int(day))
+                description = _("{0} · Use by {1}").format(description, date)
+
+            if int(count) > 1:
+                title = _("{0} (×{1})").format(title, count)
+
+        return {
+            "id": GLib.Variant("s", identifier),
+            "name": GLib.Variant("s", title),
+            "description": GLib.Variant("s", description)
+        }
+
+class SearchProvider():
+    """ Implements org.gnome.Shell.SearchProvider2 for the application """
+
+    def __init__(self, application: Gio.Application):
+        self.application = application
+        self.index = SearchIndexFile()
+        self.settings = None
+
+        # Every match of the last search, before being cut to MAX_RESULTS,
+        # and the index they are from.
+        self.matches = []
+        self.matches_file_id = None
+        self.registration_id = 0
+
+    def register(self, connection: Gio.DBusConnection, object_path: str) -> None:
+        node_info = Gio.DBusNodeInfo.new_for_xml(SEARCH_PROVIDER_XML)
+
+        self.registration_id = connection.register_object(
+            object_path,
+            node_info.interfaces[0],
+            self.on_method_call,
+            None,
+            None
+        )
+
+    def unregister(self, connection: Gio.DBusConnection) -> None:
+        if self.registration_id:
+            connection.unregister_object(self.registration_id)
+            self.registration_id = 0
+
+    def update_index(self) -> None:
+        # Settings are only read once the shell searches, so registering the
+        # provider costs nothing at startup.
+        if self.settings is None:
+            self.settings = Gio.Settings(schema_id=APPLICATION_ID)
+
+        uri = self.settings.get_string("last-file")
+        path = Gio.File.new_for_uri(uri).get_path() if uri else None
+
+        self.index.update(get_search_index_path(path) if path else None)
+
+    def on_method_call(
+        self,
+        connection: Gio.DBusConnection,
+        sender: str,
+        object_path: str,
+        interface_name: str,
+        method_name: str,
+        parameters: GLib.Variant,
+        invocation: Gio.DBusMethodInvocation
+    ) -> None:
+        # Keep the application running while the shell is searching.
+        self.application.hold()
+
+        try:
+            result = self.handle_method(method_name, parameters.unpack())
+        except (OSError, ValueError, IndexError) as e:
+            logger.warning("Could not answer %s: %s", method_name, e)
+            invocation.return_dbus_error(DBUS_ERROR_FAILED, str(e))
+            return
+        finally:
+            self.application.release()
+
+        invocation.return_value(result)
+
+    def set_matches(self, matches: List[str]) -> GLib.Variant:
+        self.matches = matches
+        self.matches_file_id = self.index.file_id
+
+        return GLib.Variant("(as)", (matches[:MAX_RESULTS],))
+
+    def handle_method(self, method_name: str, args: tuple) -> Optional[GLib.Variant]:
+        if method_name == "GetInitialResultSet":
+            (terms,) = args
+            self.update_index()
+            return self.set_matches(self.index.search(terms))
+        elif method_name == "GetSubsearchResultSet":
+            previous_results, terms = args
+            self.update_index()
+
+            # The previous results were cut short, so narrow down all of
+            # their matches instead. Search again if the index has changed.
+            if (
+                self.matches_file_id != self.index.file_id
+                or previous_results != self.matches[:MAX_RESULTS]
+            ):
+                return self.set_matches(self.index.search(terms))
+
+            return self.set_matches(self.index.refine(self.matches, terms))
+        elif method_name == "GetResultMetas":
+            (identifiers,) = args
+            metas = [self.index.get_meta(x) for x in identifiers]
+            return GLib.Variant(
+                "(aa{sv})",
+                ([meta for meta in metas if meta],)
+            )
+        elif method_name in ("ActivateResult", "LaunchSearch"):
+            self.application.activate()
+            return None
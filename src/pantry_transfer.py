@@ -0,0 +1,303 @@
+# pantry_transfer.py
+#
+# Copyright 2025 Wartybix
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <https://www.gnu.org/licenses/>.
+#
+# SPDX-License-Identifier: GPL-3.0-or-later
+
+import csv
+import datetime
+import io
+import json
+import logging
+import os
+import threading
+from gi.repository import GLib
+from typing import Callable, Dict, IO, Iterator, List, Optional, Tuple
+from scrummy.pantry import FoodItem, MealRecord, food_item_key
+from scrummy.shared import parse_day
+
+# Pantries can be imported from and exported to CSV and JSON files, e.g.
+# delivery sheets from a supplier. Each row is one food item:
+#
+#   meal          title of the meal, or empty for the unsorted food list
+#   title         name of the item
+#   best_before   ISO date (as exported), a date in the user's locale, or
+#                 empty when undated
+#   frozen        'true'/'yes'/'1' when frozen
+#
+# CSV files start with a header naming these columns. JSON files are an
+# array of objects with the same keys, written one per line.
+#
+# Files are read and written on a worker thread, a chunk of rows at a time,
+# so large files never block the main loop. Progress is reported after each
+# chunk. Imported rows are grouped per meal and sorted on the worker, so the
+# main thread adds each meal's items with a single splice.
+
+MEAL_COLUMN = "meal"
+TITLE_COLUMN = "title"
+DATE_COLUMN = "best_before"
+FROZEN_COLUMN = "frozen"
+
+COLUMNS = [MEAL_COLUMN, TITLE_COLUMN, DATE_COLUMN, FROZEN_COLUMN]
+
+JSON_SUFFIX = ".json"
+
+# Number of rows handled between progress reports.
+CHUNK_SIZE = 2000
+
+# Number of characters read from a JSON file at a time.
+READ_SIZE = 1 << 16
+
+TRUE_VALUES = {"1", "true", "yes", "y"}
+
+logger = logging.getLogger(__name__)
+
+# Items to import, by the title of their meal.
+ImportedItems = Dict[str, List[FoodItem]]
+
+class TransferError(Exception):
+    """ Raised when a file can't be imported """
+
+def is_json_path(path: str) -> bool:
+    return path.lower().endswith(JSON_SUFFIX)
+
+def parse_bb_day(text: str, current_year: int) -> Optional[int]:
+    if not text:
+        return None
+
+    try:
+        # Exported files use ISO dates, which are quicker to read.
+        return datetime.date.fromisoformat(text).toordinal()
+    except ValueError:
+        bb_day = parse_day(text, current_year)
+
+    if bb_day is None:
+        raise ValueError(f"Invalid date {text!r}")
+
+    return bb_day
+
+def item_from_row(row: dict, current_year: int) -> Tuple[str, FoodItem]:
+    """ Reads a row, returning the title of its meal and its item """
+    title = str(row.get(TITLE_COLUMN) or "").strip()
+
+    if not title:
+        raise ValueError("Missing title")
+
+    bb_day = parse_bb_day(
+        str(row.get(DATE_COLUMN) or "").strip(),
+        current_year
+    )
+
+    frozen = row.get(FROZEN_COLUMN)
+    if not isinstance(frozen, bool):
+        frozen = str(frozen or "").strip().lower() in TRUE_VALUES
+
+    meal_title = str(row.get(MEAL_COLUMN) or "").strip()
+
+    return meal_title, FoodItem(title, bb_day, frozen)
+
+def item_to_row(meal: MealRecord, item: FoodItem) -> dict:
+    bb_day = item.bb_day
+    bb_date = datetime.date.fromordinal(bb_day).isoformat() if bb_day else ""
+
+    return {
+        MEAL_COLUMN: "" if meal.misc else meal.title,
+        TITLE_COLUMN: item.title,
+        DATE_COLUMN: bb_date,
+        FROZEN_COLUMN: item.frozen
+    }
+
+def read_csv_rows(file: IO[str]) -> Iterator[dict]:
+    reader = csv.DictReader(file)
+
+    if reader.fieldnames is None:
+        return
+
+    # Column names are matched loosely, as they may be typed by hand.
+    reader.fieldnames = [
+        name.strip().lower().replace(" ", "_") for name in reader.fieldnames
+    ]
+
+    if TITLE_COLUMN not in reader.fieldnames:
+        raise TransferError(f"No '{TITLE_COLUMN}' column")
+
+    yield from reader
+
+def read_json_rows(file: IO[str]) -> Iterator[dict]:
+    """ Reads the objects of a JSON array one at a time """
+    decode = json.JSONDecoder().raw_decode
+    buffer = ""
+    position = 0
+    started = False
+    at_end = False
+
+    while True:
+        # Skip whitespace and separators, reading more of the file as needed.
+        while True:
+            while position < len(buffer) and buffer[position] in " \t\r\n,":
+                position += 1
+
+            if position < len(buffer) or at_end:
+                break
+
+            buffer = file.read(READ_SIZE)
+            position = 0
+            at_end = not buffer
+
+        if position == len(buffer):
+            raise TransferError("Unexpected end of file")
+
+        char = buffer[position]
+
+        if not started:
+            if char != "[":
+                raise TransferError("Not a JSON array")
+
+            started = True
+            position += 1
+            continue
+        elif char == "]":
+            return
+
+        try:
+            value, end = decode(buffer, position)
+        except json.JSONDecodeError as e:
+            if at_end:
+                raise TransferError(str(e)) from e
+
+            # The value is cut off at the end of the buffer.
+            chunk = file.read(READ_SIZE)
+            buffer = buffer[position:] + chunk
+            position = 0
+            at_end = not chunk
+            continue
+
+        if not isinstance(value, dict):
+            raise TransferError("Rows must be JSON objects")
+
+        position = end
+        yield value
+
+class PantryTransfer():
+    """ Imports or exports a pantry file on a worker thread """
+
+    def __init__(
+        self,
+        path: str,
+        on_progress: Callable[[float], None],
+        on_finished: Callable[..., None],
+        on_error: Callable[[str], None]
+    ):
+        self.path = path
+        self.on_progress = on_progress
+        self.on_finished = on_finished
+        self.on_error = on_error
+
+        self.thread = None
+
+    def start(self, target: Callable[..., None], *args) -> None:
+        self.thread = threading.Thread(
+            target=self.run,
+            args=(target, *args),
+            name="pantry-transfer",
+            daemon=True
+        )
+        self.thread.start()
+
+    def run(self, target: Callable[..., None], *args) -> None:
+        try:
+            target(*args)
+        except (OSError, UnicodeError, csv.Error, TransferError) as e:
+            logger.warning("Could not transfer %s: %s", self.path, e)
+            GLib.idle_add(self.on_error, str(e))
+
+    def report_progress(self, fraction: float) -> None:
+        GLib.idle_add(self.on_progress, fraction)
+
+    def start_import(self) -> None:
+        self.start(self.read_items)
+
+    def read_items(self) -> None:
+        size = os.path.getsize(self.path) or 1
+        current_year = datetime.date.today().year
+
+        items: ImportedItems = {}
+        num_skipped = 0
+
+        with open(self.path, "rb") as raw_file:
+            file = io.TextIOWrapper(raw_file, encoding="utf-8-sig", newline="")
+
+            if is_json_path(self.path):
+                rows = read_json_rows(file)
+            else:
+                rows = read_csv_rows(file)
+
+            for row_number, row in enumerate(rows, start=1):
+                try:
+                    meal_title, item = item_from_row(row, current_year)
+                except ValueError as e:
+                    logger.info("Skipping row %d: %s", row_number, e)
+                    num_skipped += 1
+                    continue
+
+                items.setdefault(meal_title, []).append(item)
+
+                if row_number % CHUNK_SIZE == 0:
+                    self.report_progress(raw_file.tell() / size)
+
+        for meal_items in items.values():
+            meal_items.sort(key=food_item_key)
+
+        GLib.idle_add(self.on_finished, items, num_skipped)
+
+    def start_export(self, meals: List[MealRecord]) -> None:
+        """ Exports copies of meal records, see MealRecord.copy() """
+        self.start(self.write_items, meals)
+
+    def write_items(self, meals: List[MealRecord]) -> None:
+        num_items = sum(map(len, meals)) or 1
+        num_written = 0
+        temp_path = self.path + ".tmp"
+        is_json = is_json_path(self.path)
+
+        with open(temp_path, "w", encoding="utf-8", newline="") as file:
+            if is_json:
+                file.write("[")
+            else:
+                writer = csv.DictWriter(file, COLUMNS)
+                writer.writeheader()
+
+            for meal in meals:
+                for item in meal.items:
+                    row = item_to_row(meal, item)
+
+                    if is_json:
+                        file.write(",\n" if num_written else "\n")
+                        file.write(json.dumps(row, ensure_ascii=False))
+                    else:
+                        writer.writerow(row)
+
+                    num_written += 1
+
+                    if num_written % CHUNK_SIZE == 0:
+                        self.report_progress(num_written / num_items)
+
+            if is_json:
+                file.write("\n]\n")
+
+        os.replace(temp_path, self.path)
+
+        GLib.idle_add(self.on_finished, num_written)
@@ -0,0 +1,136 @@
+# search_index.py
+#
+# Copyright 2025 Wartybix
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <https://www.gnu.org/licenses/>.
+#
+# SPDX-License-Identifier: GPL-3.0-or-later
+
+from typing import Any, Dict, Hashable, Iterable, Set
+
+# Entries (food items or meals) are indexed by their case-folded title, called
+# a key here. Many items share a title, so the trigram sets hold keys rather
+# than entries, which keeps the index small.
+#
+# The index remembers the keys matching the last query, and keeps them up to
+# date as entries come and go. A query that contains the last one can only
+# match a subset of those keys, so it is answered by narrowing them down
+# rather than looking the query up again.
+
+EMPTY_SET = frozenset()
+
+def get_trigrams(key: str) -> Set[str]:
+    return {key[i:i + 3] for i in range(len(key) - 2)}
+
+class SearchIndex():
+    """ An incremental trigram index over the titles of entries """
+
+    def __init__(self):
+        self.trigrams: Dict[str, Set[str]] = {}
+        self.entries: Dict[str, Set[Hashable]] = {}
+        self.keys: Dict[Hashable, str] = {}
+
+        self.last_query = None
+        self.last_keys = set()
+
+    def add(self, entry: Hashable, title: str) -> None:
+        if entry in self.keys:
+            self.remove(entry)
+
+        key = title.casefold()
+        self.keys[entry] = key
+
+        entries = self.entries.get(key)
+
+        if entries is None:
+            entries = self.entries[key] = set()
+
+            for trigram in get_trigrams(key):
+                self.trigrams.setdefault(trigram, set()).add(key)
+
+            if self.last_query is not None and self.last_query in key:
+                self.last_keys.add(key)
+
+        entries.add(entry)
+
+    def add_many(self, entries: Iterable[Any]) -> None:
+        """ Adds entries that have a 'title' attribute """
+        for entry in entries:
+            self.add(entry, entry.title)
+
+    def remove(self, entry: Hashable) -> None:
+        key = self.keys.pop(entry, None)
+
+        if key is None:
+            return
+
+        entries = self.entries[key]
+        entries.discard(entry)
+
+        if entries:
+            return
+
+        del self.entries[key]
+
+        for trigram in get_trigrams(key):
+            trigram_keys = self.trigrams[trigram]
+            trigram_keys.discard(key)
+
+            if not trigram_keys:
+                del self.trigrams[trigram]
+
+        self.last_keys.discard(key)
+
+    def clear(self) -> None:
+        """ Removes every entry, but remembers the last query """
+        self.trigrams.clear()
+        self.entries.clear()
+        self.keys.clear()
+        self.last_keys = set()
+
+    def remove_many(self, entries: Iterable[Hashable]) -> None:
+        for entry in entries:
+            self.remove(entry)
+
+    def search(self, query: str) -> Set[str]:
+        """ Finds the keys containing the query, and remembers them """
+        query = query.casefold()
+        last_query = self.last_query
+
+        if last_query is not None and last_query in query:
+            candidates = self.last_keys
+        elif len(query) >= 3:
+            # Every match contains all of the query's trigrams, so the
+            # smallest set of keys for one of them is enough to check.
+            candidates = min(
+                (self.trigrams.get(x, EMPTY_SET) for x in get_trigrams(query)),
+                key=len
+            )
+        else:
+            candidates = self.entries.keys()
+
+        keys = {key for key in candidates if query in key}
+
+        self.last_query = query
+        self.last_keys = keys
+
+        return keys
+
+    def find(self, query: str) -> Set[Hashable]:
+        """ Finds the entries whose title contains the query """
+        return set().union(*(self.entries[key] for key in self.search(query)))
+
+    def matches(self, entry: Hashable) -> bool:
+        """ Whether an entry matches the last query searched for """
+        return self.keys.get(entry) in self.last_keys
@@ -17,6 +17,79 @@
 #
 # SPDX-License-Identifier: GPL-3.0-or-later
 
-from gi.repository import GLib
+import datetime
+import os
+from functools import lru_cache
+from gi.repository import Gio, GLib
+from scrummy import PKGDATADIR
+from typing import Optional
 
-min_date = GLib.DateTime.new_local(1, 1, 1, 0, 0, 0.0)
+def day_from_date(date: GLib.DateTime) -> int:
+    """ Converts a date to its proleptic Gregorian ordinal (day number) """
+    return datetime.date(
+        date.get_year(),
+        date.get_month(),
+        date.get_day_of_month()
+    ).toordinal()
+
+@lru_cache(maxsize=1024)
+def date_from_day(day: int) -> GLib.DateTime:
+    """ Converts a day number back to a local date (at midnight) """
+    date = datetime.date.fromordinal(day)
+    return GLib.DateTime.new_local(date.year, date.month, date.day, 0, 0, 0.0)
+
+def correct_year(year: int, current_year: int) -> int:
+    """ Places a year within 50 years of the current one.
+
+    Only the last two digits of the year are kept, so '25' and '2025' are
+    read the same way.
+    """
+    entry_remainder = year % 100
+
+    range_end = current_year + 50
+
+    century_remainder = range_end % 100
+    carry = 0 if entry_remainder < century_remainder else 1
+    century = (range_end // 100 - carry) * 100
+
+    return century + entry_remainder
+
+def parse_day(text: str, current_year: Optional[int]=None) -> Optional[int]:
+    """ Parses a date written in the user's locale to a day number.
+
+    Returns None if the text isn't a date. Only a plain GLib.Date is used, so
+    this is safe to call from worker threads.
+    """
+    parsed_date = GLib.Date.new()
+    parsed_date.set_parse(text)
+
+    if not parsed_date.valid():
+        return None
+
+    if current_year is None:
+        current_year = datetime.date.today().year
+
+    try:
+        return datetime.date(
+            correct_year(parsed_date.get_year(), current_year),
+            parsed_date.get_month(),
+            parsed_date.get_day()
+        ).toordinal()
+    except ValueError:
+        # e.g. 29 February, moved to a year that isn't a leap year.
+        return None
+
+def parse_date(
+    text: str,
+    current_year: Optional[int]=None
+) -> Optional[GLib.DateTime]:
+    """ Parses a date written in the user's locale, or None if it isn't one """
+    day = parse_day(text, current_year)
+
+    return date_from_day(day) if day else None
+
+@lru_cache(maxsize=None)
+def load_dialog_resources() -> None:
+    """ Registers the resources of dialogs, which aren't needed at startup """
+    path = os.path.join(PKGDATADIR, "scrummy-dialogs.gresource")
+    Gio.Resource.load(path)._register()
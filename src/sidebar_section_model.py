@@ -17,21 +17,31 @@
 #
 # SPDX-License-Identifier: GPL-3.0-or-later
 
-from gi.repository import Adw, Gio, GLib
+from bisect import bisect_left, bisect_right
+from heapq import merge
+from gi.repository import Adw, Gio
+from scrummy.instrumentation import traced
 from scrummy.meal import Meal
-from scrummy.shared import min_date
-from typing import Optional
+from scrummy.search_index import SearchIndex
+from scrummy.date_labels import format_day, get_relative_label
+from scrummy.day_rollover import DayRanges
+from typing import Dict, Iterator, List, Optional
 
-def compare_meals(a: Meal, b: Meal) -> int:
-    a_title = a.get_title()
-    b_title = b.get_title()
+def get_meal_key(meal: Meal) -> str:
+    return meal.record.title_key
 
-    if a_title < b_title:
-        return -1
-    elif a_title == b_title:
-        return 0
-    else:
-        return 1
+def get_section_title(day: Optional[int]) -> str:
+    if not day:
+        return _("Undated")
+
+    relative_label = get_relative_label(day)
+
+    if relative_label:
+        # TRANSLATORS: {0} is a date, and {1} describes it relative to today
+        # (e.g. 'Tomorrow' or 'In 3 days').
+        return _("Eat by {0} · {1}").format(format_day(day), relative_label)
+
+    return _("Eat by {}").format(format_day(day))
 
 class SidebarSectionModel():
     def __init__(self, sidebar: Adw.Sidebar, **kwargs):
@@ -39,53 +49,195 @@ class SidebarSectionModel():
 
         self.sidebar = sidebar
         self.offset = len(sidebar.get_sections()) # For 'unsorted food' etc.
+
+        # Sections are keyed by day number, or None for undated meals. The
+        # days of the dated sections are also kept in order, so a new section
+        # can be placed by bisecting them.
         self.sections = dict()
+        self.sidebar_sections = dict()
+        self.days = []
+
+        # The sort keys of the meals in each section's store, in the same
+        # order, so meals are placed without calling into the store.
+        self.section_keys = dict()
+
+        # Titles of the meals in the sections, for the sidebar search.
+        self.meal_index = SearchIndex()
+
+    def get_section_store(self, day: Optional[int]) -> Gio.ListStore:
+        """ Gets the store of the section for a day, creating it if needed """
+        store = self.sections.get(day)
+
+        if store is None:
+            store = self.create_section(day)
+
+        return store
+
+    def create_section(self, day: Optional[int]) -> Gio.ListStore:
+        store = Gio.ListStore()
+        sidebar_section = Adw.SidebarSection()
+        sidebar_section.bind_model(store, lambda x: x)
+        sidebar_section.set_title(get_section_title(day))
+
+        if day:
+            position = bisect_left(self.days, day)
+            self.days.insert(position, day)
+
+            # Dated sections come after the undated one.
+            section_index = self.offset + position + (None in self.sections)
+        else:
+            section_index = self.offset
+
+        self.sidebar.insert(sidebar_section, section_index)
+
+        self.sections[day] = store
+        self.section_keys[day] = []
+        self.sidebar_sections[day] = sidebar_section
+
+        return store
+
+    def update_section_titles(self, ranges: DayRanges) -> None:
+        """ Updates the titles of the sections for days in the ranges """
+        days = []
+
+        # Only the few sections in the ranges are found, by bisecting the
+        # sorted days of the sections.
+        for start, end in ranges:
+            days.extend(self.days[
+                bisect_left(self.days, start):bisect_right(self.days, end)
+            ])
+
+        for day in days:
+            self.sidebar_sections[day].set_title(get_section_title(day))
+
+    def remove_section_if_empty(self, day: Optional[int]) -> None:
+        if self.section_keys[day]:
+            return
+
+        self.sidebar.remove(self.sidebar_sections.pop(day))
+        del self.sections[day]
+        del self.section_keys[day]
+
+        if day:
+            del self.days[bisect_left(self.days, day)]
 
+    @traced
     def add_meal(self, meal: Meal) -> None:
-        bb_date = meal.get_bb_date()
-        unix = bb_date.to_unix() if bb_date else None
-        sections_keys = self.sections.keys()
+        day = meal.get_bb_day()
+        store = self.get_section_store(day)
+        keys = self.section_keys[day]
 
-        if unix not in sections_keys:
-            self.sections[unix] = Gio.ListStore()
-            sidebar_section = Adw.SidebarSection()
-            sidebar_section.bind_model(self.sections[unix], lambda x: x)
+        key = get_meal_key(meal)
+        position = bisect_right(keys, key)
 
-            if bb_date:
-                section_title = _("Eat by {}").format(bb_date.format("%x"))
-                sections_sorted = sorted([
-                    0 if x is None else x for x in self.sections
-                ])
-                print(f"sections_sorted: {sections_sorted}")
-                section_index = sections_sorted.index(unix) + self.offset
-            else:
-                section_title = _("Undated")
-                section_index = 0 + self.offset
+        keys.insert(position, key)
+        store.insert(position, meal)
+        self.meal_index.add(meal, meal.record.title)
 
-            sidebar_section.set_title(section_title)
+    @traced
+    def add_meals(self, meals: List[Meal]) -> None:
+        """ Adds many meals, with one splice per affected section """
+        meals_by_section = {}
 
-            self.sidebar.insert(sidebar_section, section_index)
+        for meal in meals:
+            self.meal_index.add(meal, meal.record.title)
 
-        self.sections[unix].insert_sorted(meal, compare_meals)
+            meals_by_section.setdefault(meal.get_bb_day(), []).append(meal)
 
+        for day, section_meals in meals_by_section.items():
+            store = self.get_section_store(day)
+            keys = self.section_keys[day]
+
+            section_meals.sort(key=get_meal_key)
+
+            # Only the meals between the first and last new ones have to be
+            # merged with them.
+            start = bisect_left(keys, get_meal_key(section_meals[0]))
+            end = bisect_right(keys, get_meal_key(section_meals[-1]))
+
+            merged_meals = list(merge(
+                [store.get_item(position) for position in range(start, end)],
+                section_meals,
+                key=get_meal_key
+            ))
+
+            keys[start:end] = map(get_meal_key, merged_meals)
+            store.splice(start, end - start, merged_meals)
+
+    def get_meals(self) -> Iterator[Meal]:
+        """ Iterates over the meals in the dated and undated sections """
+        for store in self.sections.values():
+            yield from store
+
+    def clear(self) -> None:
+        """ Removes every meal and section after the offset """
+        sections = list(self.sidebar.get_sections())
+
+        for sidebar_section in sections[self.offset:]:
+            self.sidebar.remove(sidebar_section)
+
+        self.sections = dict()
+        self.sidebar_sections = dict()
+        self.days = []
+        self.section_keys = dict()
+        self.meal_index.clear()
+
+    @traced
     def remove_meal(self, meal: Meal) -> None:
-        bb_date = meal.get_bb_date()
-        unix = bb_date.to_unix() if bb_date else None
+        day = meal.get_bb_day()
         section_index = meal.get_section_index()
 
-        self.sections[unix].remove(section_index)
+        self.sections[day].remove(section_index)
+        del self.section_keys[day][section_index]
+        self.remove_section_if_empty(day)
+        self.meal_index.remove(meal)
 
         self.sidebar.set_selected(0)
 
     def update_meal_position(
         self,
         meal: Meal,
-        old_date: Optional[GLib.DateTime]
+        old_day: Optional[int]
     ) -> None:
-        section_index = meal.get_section_index()
-        unix = old_date.to_unix() if old_date else None
-        self.sections[unix].remove(section_index)
-
-        self.add_meal(meal)
+        self.update_meal_positions({meal: old_day})
 
         self.sidebar.set_selected(meal.get_index())
+
+    @traced
+    def update_meal_positions(self, old_days: Dict[Meal, Optional[int]]) -> None:
+        """ Moves meals to the sections for their current days.
+
+        Takes the day each meal was sectioned under, and changes each affected
+        section with one splice.
+        """
+        meals_by_section = {}
+
+        for meal, old_day in old_days.items():
+            meals_by_section.setdefault(old_day, []).append(meal)
+
+        for old_day, section_meals in meals_by_section.items():
+            store = self.sections[old_day]
+            keys = self.section_keys[old_day]
+
+            positions = set(meal.get_section_index() for meal in section_meals)
+            start = min(positions)
+            end = max(positions) + 1
+
+            kept_positions = [
+                position for position in range(start, end)
+                if position not in positions
+            ]
+
+            keys[start:end] = [keys[position] for position in kept_positions]
+            store.splice(
+                start,
+                end - start,
+                [store.get_item(position) for position in kept_positions]
+            )
+
+        self.add_meals(list(old_days))
+
+        # After adding, so a renamed meal's section isn't dropped and created
+        # again.
+        for old_day in meals_by_section:
+            self.remove_section_if_empty(old_day)
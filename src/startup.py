@@ -0,0 +1,55 @@
+# startup.py
+#
+# Copyright 2025 Wartybix
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <https://www.gnu.org/licenses/>.
+#
+# SPDX-License-Identifier: GPL-3.0-or-later
+
+import logging
+import time
+from typing import List, Tuple
+
+# Startup is timed in phases, each ending with a call to mark(). With logging
+# at the 'info' level (SCRUMMY_LOG=info), a breakdown is logged once the main
+# window has been shown, to keep an eye on cold start times.
+
+logger = logging.getLogger(__name__)
+
+start_time = time.perf_counter()
+phases: List[Tuple[str, float]] = []
+
+def mark(phase: str) -> None:
+    """ Records that a phase of startup has finished """
+    phases.append((phase, time.perf_counter()))
+
+def report() -> None:
+    """ Logs how long each phase of startup took """
+    if not phases:
+        return
+
+    breakdown = []
+    previous_time = start_time
+
+    for phase, end_time in phases:
+        breakdown.append(f"{phase} {(end_time - previous_time) * 1000:.1f} ms")
+        previous_time = end_time
+
+    logger.info(
+        "Started in %.1f ms: %s",
+        (previous_time - start_time) * 1000,
+        ", ".join(breakdown)
+    )
+
+    phases.clear()
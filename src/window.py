@@ -17,22 +17,84 @@
 #
 # SPDX-License-Identifier: GPL-3.0-or-later
 
-from gi.repository import Adw, Gtk, GLib, Gio
+import logging
+from contextlib import contextmanager
+from gi.repository import Adw, Gdk, Gtk, GLib, Gio, GObject
 from scrummy.ingredient import Ingredient
-from scrummy.new_meal_dialog import NewMealDialog
-from scrummy.new_ingredient_dialog import NewIngredientDialog
+from scrummy.ingredient_store import FoodItemObject
+from scrummy.pantry import FoodItem, MealRecord, food_item_key
 from scrummy.meal import Meal
 from scrummy.sidebar_section_model import SidebarSectionModel
-from scrummy.move_to_dialog import MoveToDialog
-from scrummy import PREFIX
-from typing import Optional, List
+from scrummy.pantry_file import read_pantry, PantryFileError
+from scrummy.pantry_journal import PantryJournal, get_journal_path, replay_journal
+from scrummy.pantry_transfer import ImportedItems, PantryTransfer
+from scrummy.expiry_notifier import ExpiryNotifier
+from scrummy.day_rollover import DayIndex, DayRanges
+from scrummy.instrumentation import traced
+from scrummy.history import (
+    Command,
+    History,
+    MoveItems,
+    RemoveItems,
+    RemoveMeal,
+    RenameMeal
+)
+from scrummy import APPLICATION_ID, PREFIX
+from typing import Callable, Dict, Iterator, Optional, List, Tuple
 from gettext import ngettext
 
+logger = logging.getLogger(__name__)
+
+def create_file_dialog(title: str) -> Gtk.FileDialog:
+    file_filter = Gtk.FileFilter()
+    file_filter.set_name(_("Meals Databases"))
+    file_filter.add_suffix("scrummy")
+
+    filters = Gio.ListStore.new(Gtk.FileFilter)
+    filters.append(file_filter)
+
+    return Gtk.FileDialog(
+        title=title,
+        filters=filters,
+        default_filter=file_filter
+    )
+
+def create_transfer_file_dialog(title: str) -> Gtk.FileDialog:
+    csv_filter = Gtk.FileFilter()
+    csv_filter.set_name(_("CSV Files"))
+    csv_filter.add_suffix("csv")
+
+    json_filter = Gtk.FileFilter()
+    json_filter.set_name(_("JSON Files"))
+    json_filter.add_suffix("json")
+
+    filters = Gio.ListStore.new(Gtk.FileFilter)
+    filters.append(csv_filter)
+    filters.append(json_filter)
+
+    return Gtk.FileDialog(
+        title=title,
+        filters=filters,
+        default_filter=csv_filter
+    )
+
+def get_filter_change(old_query: str, new_query: str) -> Gtk.FilterChange:
+    """ How a search filter changes when its query does """
+    if old_query in new_query:
+        # Only items that matched before can still match.
+        return Gtk.FilterChange.MORE_STRICT
+    elif new_query in old_query:
+        return Gtk.FilterChange.LESS_STRICT
+    else:
+        return Gtk.FilterChange.DIFFERENT
+
 @Gtk.Template(resource_path=f'{PREFIX}/window.ui')
 class ScrummyWindow(Adw.ApplicationWindow):
     __gtype_name__ = 'ScrummyWindow'
 
     ingredients_list = Gtk.Template.Child()
+    ingredients_selection = Gtk.Template.Child()
+    ingredients_filter_model = Gtk.Template.Child()
     split_view = Gtk.Template.Child()
     sidebar = Gtk.Template.Child()
     main_nav_page = Gtk.Template.Child()
@@ -40,6 +102,8 @@ class ScrummyWindow(Adw.ApplicationWindow):
     add_ingredient_btn = Gtk.Template.Child()
     add_ingredient_btn_empty = Gtk.Template.Child()
     ingredient_search_entry = Gtk.Template.Child()
+    search_all_meals_button = Gtk.Template.Child()
+    search_entry = Gtk.Template.Child()
     eat_btn = Gtk.Template.Child()
     content_viewstack = Gtk.Template.Child()
     search_bar = Gtk.Template.Child()
@@ -54,6 +118,10 @@ class ScrummyWindow(Adw.ApplicationWindow):
     select_mode_button = Gtk.Template.Child()
     selection_title = Gtk.Template.Child()
     window_viewstack = Gtk.Template.Child()
+    transfer_progress_bar = Gtk.Template.Child()
+
+    # Rows bind to this, so changing it only reaches the rows that exist.
+    select_mode = GObject.Property(type=bool, default=False)
 
     def __init__(self, **kwargs):
         super().__init__(**kwargs)
@@ -76,6 +144,15 @@ class ScrummyWindow(Adw.ApplicationWindow):
 
         self.sidebar_section_model = SidebarSectionModel(self.sidebar)
 
+        # Searches are answered from the indexes kept by the sidebar section
+        # model and each meal, rather than by checking every title.
+        self.meal_query = ""
+        self.meal_filter = Gtk.CustomFilter.new(self.filter_meal)
+        self.sidebar.set_filter(self.meal_filter)
+
+        self.ingredient_query = ""
+        self.ingredient_filter = Gtk.CustomFilter.new(self.filter_ingredient)
+
         self.add_ingredient_action = Gio.SimpleAction(name="add_ingredient")
         self.add_ingredient_action.connect(
             "activate",
@@ -110,106 +187,748 @@ class ScrummyWindow(Adw.ApplicationWindow):
         self.new_file_action.connect("activate", self.new_file_dialog)
         self.add_action(self.new_file_action)
 
-        self.selected_ingredients = []
+        # Enabled once a pantry is open, while no import or export is running.
+        self.import_file_action = Gio.SimpleAction(name="import_file")
+        self.import_file_action.connect("activate", self.import_file_dialog)
+        self.import_file_action.set_enabled(False)
+        self.add_action(self.import_file_action)
+
+        self.export_file_action = Gio.SimpleAction(name="export_file")
+        self.export_file_action.connect("activate", self.export_file_dialog)
+        self.export_file_action.set_enabled(False)
+        self.add_action(self.export_file_action)
+
+        self.transfer = None
+
+        self.history = History(self)
+
+        self.undo_action = Gio.SimpleAction(name="undo")
+        self.undo_action.connect("activate", lambda *_: self.history.undo())
+        self.history.bind_property(
+            "can-undo",
+            self.undo_action,
+            "enabled",
+            GObject.BindingFlags.SYNC_CREATE
+        )
+        self.add_action(self.undo_action)
+
+        self.redo_action = Gio.SimpleAction(name="redo")
+        self.redo_action.connect("activate", lambda *_: self.history.redo())
+        self.history.bind_property(
+            "can-redo",
+            self.redo_action,
+            "enabled",
+            GObject.BindingFlags.SYNC_CREATE
+        )
+        self.add_action(self.redo_action)
+
+        self.select_all_action = Gio.SimpleAction(name="select_all")
+        self.select_all_action.connect(
+            "activate",
+            lambda *_: self.ingredients_selection.select_all()
+        )
+        self.add_action(self.select_all_action)
+
+        self.invert_selection_action = Gio.SimpleAction(name="invert_selection")
+        self.invert_selection_action.connect(
+            "activate",
+            lambda *_: self.invert_selection()
+        )
+        self.add_action(self.invert_selection_action)
+
+        # Position of the last row toggled, for selecting a range from it.
+        self.selection_anchor = None
+
+        self.ingredients_selection.connect(
+            "selection-changed",
+            lambda *_: self.update_selection_counter()
+        )
+        self.ingredients_selection.connect(
+            "items-changed",
+            lambda *_: self.update_selection_counter()
+        )
+
+        # Meals changed in the current batch of changes, if any, mapped to
+        # their day before the batch.
+        self.changed_meals = None
+
+        # Rows currently showing a dated item, by its day, to update their
+        # dates when the day changes.
+        self.bound_rows = DayIndex()
+
+        # The day may have changed while the computer was suspended.
+        self.connect("notify::is-active", self.on_active_changed)
+
+        self.settings = Gio.Settings(schema_id=APPLICATION_ID)
+        self.pantry_file = None
+        self.journal = None
+        self.next_meal_id = 1
 
         self.refresh_main_content()
 
+        last_file = self.settings.get_string("last-file")
+        if last_file:
+            self.load_pantry(Gio.File.new_for_uri(last_file))
+
     def open_file_dialog(
         self,
         action: Gio.Action,
         parameter: GLib.Variant
     ) -> None:
-        # TODO: make functional
-        self.window_viewstack.set_visible_child_name("split_view_page")
+        dialog = create_file_dialog(_("Open Meals Database"))
+        dialog.open(self, None, self.on_open_file_response)
+
+    def on_open_file_response(
+        self,
+        dialog: Gtk.FileDialog,
+        result: Gio.AsyncResult
+    ) -> None:
+        try:
+            file = dialog.open_finish(result)
+        except GLib.Error:
+            # The dialog was dismissed.
+            return
+
+        self.load_pantry(file)
 
     def new_file_dialog(
         self,
         action: Gio.Action,
         parameter: GLib.Variant
     ) -> None:
-        # TODO: make functional
+        dialog = create_file_dialog(_("Create Meals Database"))
+        dialog.set_initial_name("meals.scrummy")
+        dialog.save(self, None, self.on_new_file_response)
+
+    def on_new_file_response(
+        self,
+        dialog: Gtk.FileDialog,
+        result: Gio.AsyncResult
+    ) -> None:
+        try:
+            file = dialog.save_finish(result)
+        except GLib.Error:
+            # The dialog was dismissed.
+            return
+
+        self.set_pantry(file, 0, MealRecord(misc=True), [], None)
+
+    def load_pantry(self, file: Gio.File) -> None:
+        file.load_contents_async(None, self.on_pantry_loaded)
+
+    def on_pantry_loaded(self, file: Gio.File, result: Gio.AsyncResult) -> None:
+        try:
+            success, contents, etag = file.load_contents_finish(result)
+            generation, unsorted_food, meal_records = read_pantry(contents)
+
+            if not file.get_path():
+                raise PantryFileError("Not a local file")
+
+            # Recover changes made after the last snapshot.
+            meal_records, num_changes = replay_journal(
+                get_journal_path(file.get_path()),
+                generation,
+                unsorted_food,
+                meal_records
+            )
+        except (GLib.Error, PantryFileError) as e:
+            logger.warning("Could not open %s: %s", file.get_uri(), e)
+
+            toast = Adw.Toast.new(
+                # TRANSLATORS: {} represents a file name.
+                _("Could not open ‘{}’").format(file.get_basename())
+            )
+            self.toast_overlay.add_toast(toast)
+            return
+
+        self.set_pantry(
+            file,
+            generation,
+            unsorted_food,
+            meal_records,
+            num_changes
+        )
+
+    @traced
+    def set_pantry(
+        self,
+        file: Gio.File,
+        generation: int,
+        unsorted_food: MealRecord,
+        meal_records: List[MealRecord],
+        num_changes: Optional[int]
+    ) -> None:
+        if self.journal:
+            self.journal.close()
+
+        self.pantry_file = file
+        self.settings.set_string("last-file", file.get_uri())
+
+        self.unsorted_food.set_ingredients(unsorted_food.items)
+
+        self.sidebar_section_model.clear()
+        self.sidebar_section_model.add_meals(
+            [Meal(record) for record in meal_records]
+        )
+
+        self.expiry_notifier.clear()
+        self.expiry_notifier.add_counts(unsorted_food.get_day_counts())
+        for record in meal_records:
+            self.expiry_notifier.add_counts(record.get_day_counts())
+
+        self.next_meal_id = max(
+            [record.id for record in meal_records], default=0
+        ) + 1
+
+        self.journal = PantryJournal(
+            file.get_path(),
+            generation,
+            self.get_pantry_state,
+            self.on_journal_error,
+            num_changes
+        )
+
+        self.move_selected_ingredients_action.set_enabled(len(meal_records) > 0)
+        self.set_transfer_enabled(self.transfer is None)
+        self.history.clear()
+
+        self.sidebar.set_selected(0)
+        self.refresh_main_content()
+        self.split_view.set_show_content(False)
+
         self.window_viewstack.set_visible_child_name("split_view_page")
 
-    def show_move_to_dialog(
+    @property
+    def expiry_notifier(self) -> ExpiryNotifier:
+        return self.get_application().expiry_notifier
+
+    def get_pantry_state(self) -> Tuple[MealRecord, List[MealRecord]]:
+        return (
+            self.unsorted_food.record,
+            [meal.record for meal in self.sidebar_section_model.get_meals()]
+        )
+
+    def on_journal_error(self, message: str) -> None:
+        logger.warning(
+            "Could not save %s: %s",
+            self.pantry_file.get_uri(),
+            message
+        )
+
+        toast = Adw.Toast.new(_("Could not save changes"))
+        toast.set_priority(Adw.ToastPriority.HIGH)
+        self.toast_overlay.add_toast(toast)
+
+    def set_transfer_enabled(self, enabled: bool) -> None:
+        self.import_file_action.set_enabled(enabled)
+        self.export_file_action.set_enabled(enabled)
+
+    def import_file_dialog(
         self,
         action: Gio.Action,
         parameter: GLib.Variant
     ) -> None:
-        self.do_show_move_to_dialog(self.selected_ingredients)
+        dialog = create_transfer_file_dialog(_("Import Food"))
+        dialog.open(self, None, self.on_import_file_response)
 
-    def do_show_move_to_dialog(self, ingredients: List[Ingredient]) -> None:
-        selected_meal = self.sidebar.get_selected_item()
-        all_meals = self.sidebar.get_items()
+    def on_import_file_response(
+        self,
+        dialog: Gtk.FileDialog,
+        result: Gio.AsyncResult
+    ) -> None:
+        try:
+            file = dialog.open_finish(result)
+        except GLib.Error:
+            # The dialog was dismissed.
+            return
 
-        dialog = MoveToDialog(
-            lambda meal: self.do_move(ingredients, meal),
-            all_meals,
-            selected_meal
+        if not file.get_path():
+            self.show_transfer_error(file)
+            return
+
+        self.start_transfer(
+            file.get_path(),
+            self.on_import_finished
+        ).start_import()
+
+    def export_file_dialog(
+        self,
+        action: Gio.Action,
+        parameter: GLib.Variant
+    ) -> None:
+        dialog = create_transfer_file_dialog(_("Export Food"))
+        dialog.set_initial_name("food.csv")
+        dialog.save(self, None, self.on_export_file_response)
+
+    def on_export_file_response(
+        self,
+        dialog: Gtk.FileDialog,
+        result: Gio.AsyncResult
+    ) -> None:
+        try:
+            file = dialog.save_finish(result)
+        except GLib.Error:
+            # The dialog was dismissed.
+            return
+
+        if not file.get_path():
+            self.show_transfer_error(file)
+            return
+
+        unsorted_food, meals = self.get_pantry_state()
+
+        # Copy the records, so the pantry can keep changing meanwhile.
+        self.start_transfer(
+            file.get_path(),
+            self.on_export_finished
+        ).start_export([unsorted_food.copy()] + [meal.copy() for meal in meals])
+
+    def start_transfer(
+        self,
+        path: str,
+        on_finished: Callable[..., None]
+    ) -> PantryTransfer:
+        self.transfer = PantryTransfer(
+            path,
+            self.on_transfer_progress,
+            on_finished,
+            self.on_transfer_error
         )
-        dialog.present(self)
 
-    def do_move(self, ingredients: List[Ingredient], dest_meal: Meal) -> None:
-        source_meal = self.sidebar.get_selected_item()
+        self.set_transfer_enabled(False)
+        self.transfer_progress_bar.set_fraction(0.0)
+        self.transfer_progress_bar.set_visible(True)
 
-        self.do_remove_ingredients(ingredients)
+        return self.transfer
 
-        dest_old_date = dest_meal.get_bb_date()
+    def end_transfer(self) -> None:
+        self.transfer = None
 
-        for ingredient in ingredients:
-            dest_meal.add_ingredient(ingredient)
+        self.transfer_progress_bar.set_visible(False)
+        self.set_transfer_enabled(self.journal is not None)
 
-        if dest_meal != self.unsorted_food:
-            self.sidebar_section_model.update_meal_position(
-                dest_meal,
-                dest_old_date
-            )
+    def on_transfer_progress(self, fraction: float) -> None:
+        self.transfer_progress_bar.set_fraction(fraction)
 
-        self.sidebar.set_selected(source_meal.get_index())
+    def on_transfer_error(self, message: str) -> None:
+        file = Gio.File.new_for_path(self.transfer.path)
+        self.end_transfer()
 
-    def eat_selected_ingredients(
+        self.show_transfer_error(file)
+
+    def show_transfer_error(self, file: Gio.File) -> None:
+        toast = Adw.Toast.new(
+            # TRANSLATORS: {} represents a file name.
+            _("Could not transfer food with ‘{}’").format(file.get_basename())
+        )
+        toast.set_priority(Adw.ToastPriority.HIGH)
+        self.toast_overlay.add_toast(toast)
+
+    def on_import_finished(self, items: ImportedItems, num_skipped: int) -> None:
+        self.end_transfer()
+
+        if self.journal is None:
+            return
+
+        self.add_imported_items(items)
+
+        num_items = sum(map(len, items.values()))
+        toast_msg = ngettext(
+            "{} item imported",
+            "{} items imported",
+            num_items
+        ).format(num_items)
+
+        if num_skipped:
+            toast_msg = ngettext(
+                "{} ({} invalid row skipped)",
+                "{} ({} invalid rows skipped)",
+                num_skipped
+            ).format(toast_msg, num_skipped)
+
+        self.toast_overlay.add_toast(Adw.Toast.new(toast_msg))
+
+    def on_export_finished(self, num_items: int) -> None:
+        self.end_transfer()
+
+        self.toast_overlay.add_toast(Adw.Toast.new(ngettext(
+            "{} item exported",
+            "{} items exported",
+            num_items
+        ).format(num_items)))
+
+    @traced
+    def add_imported_items(self, items: ImportedItems) -> None:
+        """ Adds imported items to their meals, creating any missing ones """
+        selected_meal = self.sidebar.get_selected_item()
+        meals_by_title = {
+            meal.get_title(): meal
+            for meal in self.sidebar_section_model.get_meals()
+        }
+        new_meals = []
+
+        with self.batch_changes():
+            for title, meal_items in items.items():
+                meal = meals_by_title.get(title) if title else self.unsorted_food
+
+                if meal is not None:
+                    self.add_items_to_meal(meal, meal_items)
+                    continue
+
+                record = self.create_meal_record(title)
+                record.items = meal_items
+                new_meals.append(Meal(record))
+
+        if not new_meals:
+            return
+
+        # Add the meals before journalling them, as insert_meal does, so a
+        # snapshot of the pantry includes them.
+        self.sidebar_section_model.add_meals(new_meals)
+        self.sidebar.set_selected(selected_meal.get_index())
+        self.move_selected_ingredients_action.set_enabled(True)
+
+        for meal in new_meals:
+            self.journal.add_meal(meal.record)
+            self.journal.add_items(meal.record, meal.record.items)
+            self.expiry_notifier.add_counts(meal.record.get_day_counts())
+
+    def take_meal_id(self) -> int:
+        meal_id = self.next_meal_id
+        self.next_meal_id += 1
+
+        return meal_id
+
+    def create_meal_record(self, title: str) -> MealRecord:
+        return MealRecord(title, id=self.take_meal_id())
+
+    def close_journal(self) -> None:
+        """ Saves any outstanding changes to the pantry file """
+        if self.journal:
+            self.journal.close()
+            self.journal = None
+
+    def do_close_request(self) -> bool:
+        self.close_journal()
+
+        return False
+
+    def show_move_to_dialog(
         self,
         action: Gio.Action,
         parameter: GLib.Variant
     ) -> None:
-        self.do_eat_ingredients(self.selected_ingredients)
+        self.do_show_move_to_dialog(self.get_selected_ingredients())
 
-    def do_remove_ingredients(self, ingredients: List[Ingredient]) -> None:
-        selected_meal = self.sidebar.get_selected_item()
+    def do_show_move_to_dialog(
+        self,
+        ingredients: List[FoodItem],
+        source_meal: Optional[Meal]=None
+    ) -> None:
+        source_meal = source_meal or self.sidebar.get_selected_item()
+        all_meals = self.sidebar.get_items()
 
-        old_date = selected_meal.get_bb_date()
+        # Dialogs are imported when first used, to keep startup short.
+        from scrummy.move_to_dialog import MoveToDialog
 
-        for ingredient in ingredients:
-            selected_meal.remove_ingredient(ingredient)
+        dialog = MoveToDialog(
+            lambda meal: self.do_move(ingredients, meal, source_meal),
+            all_meals,
+            source_meal
+        )
+        dialog.present(self)
 
-        if selected_meal != self.unsorted_food:
-            self.sidebar_section_model.update_meal_position(
-                selected_meal,
-                old_date
-            )
+    def do_move(
+        self,
+        ingredients: List[FoodItem],
+        dest_meal: Meal,
+        source_meal: Optional[Meal]=None
+    ) -> None:
+        source_meal = source_meal or self.sidebar.get_selected_item()
 
-        self.set_main_page(len(selected_meal.ingredients) == 0)
+        self.history.perform(MoveItems(source_meal, dest_meal, ingredients))
         self.set_select_mode(False)
 
-    def do_eat_ingredients(self, ingredients: List[Ingredient]) -> None:
-        self.do_remove_ingredients(ingredients)
-        selected_meal = self.sidebar.get_selected_item()
+    def eat_selected_ingredients(
+        self,
+        action: Gio.Action,
+        parameter: GLib.Variant
+    ) -> None:
+        self.do_eat_ingredients(self.get_selected_ingredients())
+
+    def do_remove_ingredients(
+        self,
+        ingredients: List[FoodItem],
+        meal: Optional[Meal]=None
+    ) -> Command:
+        meal = meal or self.sidebar.get_selected_item()
+
+        command = RemoveItems(meal, ingredients)
+        self.history.perform(command)
+        self.set_select_mode(False)
+
+        return command
+
+    def do_eat_ingredients(
+        self,
+        ingredients: List[FoodItem],
+        meal: Optional[Meal]=None
+    ) -> None:
+        meal = meal or self.sidebar.get_selected_item()
+        command = self.do_remove_ingredients(ingredients, meal)
 
         if len(ingredients) == 1:
-            toast_msg = _("‘{}’ marked as eaten").format(
-                ingredients[0].get_title()
-            )
+            toast_msg = _("‘{}’ marked as eaten").format(ingredients[0].title)
         else:
-            if selected_meal == self.unsorted_food:
+            if meal == self.unsorted_food:
                 toast_msg = ngettext("{} item marked as eaten", "{} items marked as eaten", len(ingredients))
             else:
                 toast_msg = ngettext("{} ingredient marked as eaten", "{} ingredients marked as eaten", len(ingredients))
             toast_msg = toast_msg.format(len(ingredients))
 
-        toast = Adw.Toast.new(toast_msg)
-        toast.set_button_label(_("Undo")) # TODO: make this button do something
+        self.show_undo_toast(toast_msg, command)
+
+    def show_undo_toast(self, title: str, command: Command) -> None:
+        toast = Adw.Toast.new(title)
+        toast.set_button_label(_("Undo"))
         toast.set_priority(Adw.ToastPriority.HIGH)
+        toast.connect("button-clicked", lambda _toast: self.history.undo(command))
         self.toast_overlay.add_toast(toast)
 
+    # The methods below apply changes to the pantry for History commands. They
+    # keep the sidebar, main page and journal up to date with the change.
+
+    def add_items_to_meal(self, meal: Meal, items: List[FoodItem]) -> None:
+        old_day = meal.get_bb_day()
+
+        meal.add_ingredients(items)
+        self.journal.add_items(meal.record, items)
+        self.expiry_notifier.add_items(items)
+
+        self.on_meal_ingredients_changed(meal, old_day)
+
+    def remove_items_from_meal(self, meal: Meal, items: List[FoodItem]) -> None:
+        old_day = meal.get_bb_day()
+
+        meal.remove_ingredients(items)
+        self.journal.remove_items(meal.record, items)
+        self.expiry_notifier.remove_items(items)
+
+        self.on_meal_ingredients_changed(meal, old_day)
+
+    def replace_item_in_meal(
+        self,
+        meal: Meal,
+        old_item: FoodItem,
+        new_item: FoodItem
+    ) -> None:
+        old_day = meal.get_bb_day()
+
+        meal.replace_ingredient(old_item, new_item)
+        self.journal.replace_item(meal.record, old_item, new_item)
+        self.expiry_notifier.remove_items([old_item])
+        self.expiry_notifier.add_items([new_item])
+
+        self.on_meal_ingredients_changed(meal, old_day)
+
+    @contextmanager
+    def batch_changes(self) -> Iterator[None]:
+        """ Updates the sidebar and main page once, after a group of changes """
+        if self.changed_meals is not None:
+            # Already in a batch.
+            yield
+            return
+
+        self.changed_meals = {}
+
+        try:
+            yield
+        finally:
+            changed_meals = self.changed_meals
+            self.changed_meals = None
+
+            self.on_meals_changed(changed_meals)
+
+    def on_meal_ingredients_changed(
+        self,
+        meal: Meal,
+        old_day: Optional[int]
+    ) -> None:
+        if self.changed_meals is None:
+            self.on_meals_changed({meal: old_day})
+        else:
+            self.changed_meals.setdefault(meal, old_day)
+
+    @traced
+    def on_meals_changed(self, old_days: Dict[Meal, Optional[int]]) -> None:
+        selected_meal = self.sidebar.get_selected_item()
+
+        # Meals are only moved when their section changes, as their title
+        # (which orders them within it) is the same.
+        moved_meals = {
+            meal: old_day for meal, old_day in old_days.items()
+            if meal != self.unsorted_food and meal.get_bb_day() != old_day
+        }
+
+        if moved_meals:
+            self.sidebar_section_model.update_meal_positions(moved_meals)
+
+            # Repositioning can change the selection, so select the shown
+            # meal again.
+            self.sidebar.set_selected(selected_meal.get_index())
+
+        if selected_meal in old_days:
+            self.set_main_page(len(selected_meal.ingredients) == 0)
+
+        if self.is_searching_all_meals():
+            self.update_ingredient_search()
+
+    @traced
+    def set_meal_title(self, meal: Meal, title: str) -> None:
+        selected_meal = self.sidebar.get_selected_item()
+
+        meal.set_title(title)
+        self.sidebar_section_model.update_meal_position(
+            meal,
+            meal.get_bb_day()
+        )
+        self.sidebar.set_selected(selected_meal.get_index())
+
+        if meal == selected_meal:
+            self.main_nav_page.set_title(title)
+
+        self.journal.rename_meal(meal.record)
+
+    @traced
+    def insert_meal(self, meal: Meal) -> None:
+        self.sidebar_section_model.add_meal(meal)
+
+        self.journal.add_meal(meal.record)
+        if meal.record.items:
+            self.journal.add_items(meal.record, meal.record.items)
+            self.expiry_notifier.add_counts(meal.record.get_day_counts())
+
+        self.move_selected_ingredients_action.set_enabled(True)
+
+    @traced
+    def remove_meal(self, meal: Meal) -> None:
+        selected_meal = self.sidebar.get_selected_item()
+
+        self.sidebar_section_model.remove_meal(meal)
+        self.journal.remove_meal(meal.record)
+        self.expiry_notifier.remove_counts(meal.record.get_day_counts())
+
+        all_meals = self.sidebar.get_items()
+        self.move_selected_ingredients_action.set_enabled(len(all_meals) > 1)
+
+        if meal == selected_meal:
+            # TODO: fix cases where sidebar selected desynced from main view
+            self.refresh_main_content()
+            self.split_view.set_show_content(False)
+        else:
+            self.sidebar.set_selected(selected_meal.get_index())
+
+            if self.is_searching_all_meals():
+                self.update_ingredient_search()
+
+    def on_active_changed(
+        self,
+        window: Gtk.Window,
+        pspec: GObject.ParamSpec
+    ) -> None:
+        if self.is_active():
+            self.get_application().refresh_date_labels()
+
+    def on_date_labels_changed(self, ranges: DayRanges) -> None:
+        """ Shows the dates of days in the ranges again """
+        self.sidebar_section_model.update_section_titles(ranges)
+
+        for row in self.bound_rows.find(ranges):
+            row.update_subtitle()
+
+    def filter_meal(self, meal: Meal) -> bool:
+        if not self.meal_query:
+            return True
+
+        if meal.misc_meal:
+            # Meals like 'Unsorted Food' aren't in the sections' index.
+            return self.meal_query in meal.get_title().casefold()
+
+        return self.sidebar_section_model.meal_index.matches(meal)
+
+    def filter_ingredient(self, item_object: FoodItemObject) -> bool:
+        return item_object.meal.search_index.matches(item_object.item)
+
+    @Gtk.Template.Callback()
+    def on_meal_search_changed(self, search_entry: Gtk.SearchEntry) -> None:
+        query = search_entry.get_text().casefold()
+        change = get_filter_change(self.meal_query, query)
+
+        self.meal_query = query
+        if query:
+            self.sidebar_section_model.meal_index.search(query)
+
+        self.meal_filter.changed(change)
+
+    @Gtk.Template.Callback()
+    def on_ingredient_search_changed(self, widget: Gtk.Widget) -> None:
+        self.update_ingredient_search()
+
+    def is_searching_all_meals(self) -> bool:
+        return bool(self.ingredient_query) and \
+            self.search_all_meals_button.get_active()
+
+    @traced
+    def update_ingredient_search(self) -> None:
+        """ Shows the ingredients matching the ingredient search """
+        selected_meal = self.sidebar.get_selected_item()
+        filter_model = self.ingredients_filter_model
+
+        old_query = self.ingredient_query
+        query = self.ingredient_search_entry.get_text().casefold()
+        self.ingredient_query = query
+
+        if not query:
+            filter_model.set_filter(None)
+            filter_model.set_model(selected_meal.ingredients)
+        elif self.search_all_meals_button.get_active():
+            # Items can't be selected across meals.
+            self.set_select_mode(False)
+
+            filter_model.set_filter(None)
+            filter_model.set_model(self.find_in_all_meals(query))
+        else:
+            selected_meal.search_index.search(query)
+            filter_model.set_model(selected_meal.ingredients)
+
+            if filter_model.get_filter() is None:
+                filter_model.set_filter(self.ingredient_filter)
+            else:
+                self.ingredient_filter.changed(
+                    get_filter_change(old_query, query)
+                )
+
+        self.select_mode_button.set_sensitive(
+            not self.is_searching_all_meals()
+        )
+
+    @traced
+    def find_in_all_meals(self, query: str) -> Gio.ListStore:
+        """ Finds the items of every meal matching a query, in date order """
+        results = []
+
+        for meal in self.sidebar.get_items():
+            results.extend(
+                (item, meal) for item in meal.search_index.find(query)
+            )
+
+        results.sort(key=lambda result: food_item_key(result[0]))
+
+        store = Gio.ListStore.new(FoodItemObject)
+        store.splice(0, 0, [FoodItemObject(item, meal) for item, meal in results])
+
+        return store
+
     @Gtk.Template.Callback()
     def enable_select_mode(self, widget: Gtk.Widget, **kwargs) -> None:
         self.set_select_mode(True)
@@ -239,51 +958,94 @@ class ScrummyWindow(Adw.ApplicationWindow):
         self.do_select_gesture(x, y)
 
     def do_select_gesture(self, x: float, y: float) -> None:
+        if self.is_searching_all_meals():
+            return
+
         self.set_select_mode(True)
         pick = self.ingredients_list.pick(x, y, Gtk.PickFlags.DEFAULT)
 
-        if pick is not Ingredient:
+        if pick is None:
+            # The press wasn't on any widget.
+            return
+
+        if not isinstance(pick, Ingredient):
             pick = pick.get_ancestor(Ingredient)
 
-        pick.set_selected(True)
+        if pick:
+            pick.check_button.set_active(True)
 
     def set_select_mode(self, enabled: bool) -> None:
-        normal_headerbar = self.normal_headerbar
-        select_mode_headerbar = self.select_mode_headerbar
+        if self.props.select_mode == enabled:
+            # Don't do anything when the state is the same as before.
+            return
 
-        manage_bar = self.management_action_bar
-        add_bar = self.add_ingredient_action_bar
+        self.header_viewstack.set_visible_child(
+            self.select_mode_headerbar if enabled else self.normal_headerbar
+        )
+        self.bottom_bar_viewstack.set_visible_child(
+            self.management_action_bar if enabled
+            else self.add_ingredient_action_bar
+        )
 
-        header_viewstack = self.header_viewstack
-        bottom_viewstack = self.bottom_bar_viewstack
+        self.ingredients_selection.unselect_all()
+        self.selection_anchor = None
 
-        visible_headerbar = header_viewstack.get_visible_child()
-        select_mode_on = visible_headerbar == select_mode_headerbar
+        self.props.select_mode = enabled
 
-        if select_mode_on == enabled:
-            # Don't do anything when the state is the same as before.
-            return
+    def is_select_mode(self) -> bool:
+        return self.props.select_mode
 
-        header_viewstack.set_visible_child(
-            select_mode_headerbar if enabled else normal_headerbar
-        )
-        bottom_viewstack.set_visible_child(manage_bar if enabled else add_bar)
+    def get_selected_ingredients(self) -> List[FoodItem]:
+        selection = self.ingredients_selection.get_selection()
 
-        selected_meal = self.sidebar.get_selected_item()
-        selected_meal.set_selectable(enabled)
+        return [
+            self.ingredients_selection.get_item(selection.get_nth(i)).item
+            for i in range(selection.get_size())
+        ]
 
-        self.selected_ingredients = []
+    def invert_selection(self) -> None:
+        num_items = self.ingredients_selection.get_n_items()
+        all_items = Gtk.Bitset.new_range(0, num_items)
 
-    def add_selection(self, ingredient: Ingredient) -> None:
-        self.selected_ingredients.append(ingredient)
-        self.update_selection_counter()
+        inverted = all_items.copy()
+        inverted.subtract(self.ingredients_selection.get_selection())
 
-    def remove_selection(self, ingredient: Ingredient) -> None:
-        self.selected_ingredients.remove(ingredient)
-        self.update_selection_counter()
+        self.ingredients_selection.set_selection(inverted, all_items)
+
+    def on_ingredient_toggled(
+        self,
+        check_button: Gtk.CheckButton,
+        list_item: Gtk.ListItem
+    ) -> None:
+        is_active = check_button.get_active()
+
+        if not check_button.get_sensitive() or is_active == list_item.get_selected():
+            # Not in select mode, or the button is just showing the selection.
+            return
+
+        position = list_item.get_position()
+        anchor = self.selection_anchor
+        self.selection_anchor = position
+
+        keyboard = self.get_display().get_default_seat().get_keyboard()
+        extend = keyboard and \
+            keyboard.get_modifier_state() & Gdk.ModifierType.SHIFT_MASK
+
+        if is_active and extend and anchor is not None:
+            # Shift selects every row from the last one toggled.
+            start = min(anchor, position)
+            self.ingredients_selection.select_range(
+                start,
+                abs(anchor - position) + 1,
+                False
+            )
+        elif is_active:
+            self.ingredients_selection.select_item(position, False)
+        else:
+            self.ingredients_selection.unselect_item(position)
 
     def update_selection_counter(self) -> None:
-        num_selected = len(self.selected_ingredients)
+        num_selected = self.ingredients_selection.get_selection().get_size()
 
         selected_meal = self.sidebar.get_selected_item()
 
@@ -301,12 +1063,13 @@ class ScrummyWindow(Adw.ApplicationWindow):
         selected_meal = self.sidebar.get_selected_item()
 
         def do_rename(new_name):
-            selected_meal.set_title(new_name)
-            self.sidebar_section_model.update_meal_position(
+            self.history.perform(RenameMeal(
                 selected_meal,
-                selected_meal.get_bb_date()
-            )
-            self.main_nav_page.set_title(new_name)
+                selected_meal.get_title(),
+                new_name
+            ))
+
+        from scrummy.new_meal_dialog import NewMealDialog
 
         dialog = NewMealDialog(
             do_rename,
@@ -314,24 +1077,24 @@ class ScrummyWindow(Adw.ApplicationWindow):
         )
         dialog.present(self)
 
+    @traced
     def duplicate_meal(
         self,
         action: Gio.Action,
         parameter: GLib.Variant
     ) -> None:
         selected_meal = self.sidebar.get_selected_item()
-        new_meal = Meal(selected_meal.get_title(), Gio.ListStore(), False)
-        new_ingredients = []
 
-        i = 0
-        while ingredient := selected_meal.ingredients.get_item(i):
-            new_ingredients.append(ingredient.copy())
-            i += 1
+        # Counted before duplicating, so both meals share the cached counts.
+        day_counts = selected_meal.record.get_day_counts()
 
-        new_meal.ingredients.splice(0, 0, new_ingredients)
-        new_meal.update_subtitle()
+        # The duplicate shares the meal's items until either is changed.
+        new_record = selected_meal.record.duplicate(self.take_meal_id())
+        new_meal = Meal(new_record)
 
         self.sidebar_section_model.add_meal(new_meal)
+        self.journal.duplicate_meal(selected_meal.record, new_record)
+        self.expiry_notifier.add_counts(day_counts)
 
         toast = Adw.Toast.new(
             # TRANSLATORS: {} represents a name of a meal.
@@ -340,22 +1103,16 @@ class ScrummyWindow(Adw.ApplicationWindow):
         self.toast_overlay.add_toast(toast)
 
     def eat_meal(self, action: Gio.Action, parameter: GLib.Variant) -> None:
-        # TODO: fix cases where sidebar selected desynced from main view
         selected_item = self.sidebar.get_selected_item()
-        self.sidebar_section_model.remove_meal(selected_item)
-        self.refresh_main_content()
-        self.split_view.set_show_content(False)
 
-        all_meals = self.sidebar.get_items()
-        self.move_selected_ingredients_action.set_enabled(len(all_meals) > 1)
+        command = RemoveMeal(selected_item)
+        self.history.perform(command)
 
-        toast = Adw.Toast.new(
+        self.show_undo_toast(
             # TRANSLATORS: {} represents a name of a meal.
-            _("‘{}’ marked as eaten").format(selected_item.get_title())
+            _("‘{}’ marked as eaten").format(selected_item.get_title()),
+            command
         )
-        toast.set_button_label(_("Undo")) # TODO: make this button do something
-        toast.set_priority(Adw.ToastPriority.HIGH)
-        self.toast_overlay.add_toast(toast)
 
     def set_main_page(self, is_empty: bool) -> None:
         page_name = "empty-meal-page" if is_empty else "ingredients-page"
@@ -364,6 +1121,7 @@ class ScrummyWindow(Adw.ApplicationWindow):
         self.bottom_bar_viewstack.set_visible(not is_empty)
         self.select_mode_button.set_visible(not is_empty)
 
+    @traced
     def refresh_main_content(self) -> None:
         selected_item = self.sidebar.get_selected_item()
         page_title = selected_item.get_title()
@@ -391,7 +1149,9 @@ class ScrummyWindow(Adw.ApplicationWindow):
 
         self.main_nav_page.set_title(page_title)
 
-        self.ingredients_list.bind_model(selected_item.ingredients, lambda x: x)
+        # Searches start again for each meal.
+        self.ingredient_search_entry.set_text("")
+        self.update_ingredient_search()
 
         empty_meal = len(selected_item.ingredients) == 0
         self.set_main_page(empty_meal)
@@ -402,33 +1162,109 @@ class ScrummyWindow(Adw.ApplicationWindow):
         self.empty_status_page.set_title(empty_status_page_title)
         self.empty_status_page.set_description(empty_status_page_desc)
 
-        self.header_viewstack.set_visible_child(self.normal_headerbar)
-        self.bottom_bar_viewstack.set_visible_child(self.add_ingredient_action_bar)
-        selected_item.set_selectable(False)
-        self.selected_ingredients = []
+        self.set_select_mode(False)
 
-        print('------------')
-        for meal in list(self.sidebar.get_items()):
-            print(meal)
+        self.log_meals()
 
         self.split_view.set_show_content(True);
 
+    def log_meals(self) -> None:
+        # Listing every item is slow for large pantries, so only do it when
+        # it will be shown.
+        if not logger.isEnabledFor(logging.DEBUG):
+            return
+
+        logger.debug(
+            "Meals:\n%s",
+            "\n".join(str(meal) for meal in self.sidebar.get_items())
+        )
+
+    @Gtk.Template.Callback()
+    def on_ingredient_setup(
+        self,
+        factory: Gtk.SignalListItemFactory,
+        list_item: Gtk.ListItem
+    ) -> None:
+        row = Ingredient()
+        list_item.set_child(row)
+        list_item.set_activatable(False)
+
+        # Clicking a row would otherwise select it alone, dropping the rest of
+        # the selection, and select rows outside select mode. The selection
+        # is only changed through the check buttons and the select actions.
+        list_item.set_selectable(False)
+
+        # The row's check button shows whether its item is selected, and
+        # toggling it changes the selection.
+        list_item.bind_property(
+            "selected",
+            row.check_button,
+            "active",
+            GObject.BindingFlags.SYNC_CREATE
+        )
+        self.bind_property(
+            "select-mode",
+            row,
+            "select-mode",
+            GObject.BindingFlags.SYNC_CREATE
+        )
+        row.toggled_handler = row.check_button.connect(
+            "toggled",
+            self.on_ingredient_toggled,
+            list_item
+        )
+
+    @Gtk.Template.Callback()
+    def on_ingredient_bind(
+        self,
+        factory: Gtk.SignalListItemFactory,
+        list_item: Gtk.ListItem
+    ) -> None:
+        row = list_item.get_child()
+        item_object = list_item.get_item()
+
+        row.bind(item_object, self.is_searching_all_meals())
+
+        bb_day = item_object.item.bb_day
+        if bb_day:
+            self.bound_rows.add(bb_day, row)
+
+    @Gtk.Template.Callback()
+    def on_ingredient_unbind(
+        self,
+        factory: Gtk.SignalListItemFactory,
+        list_item: Gtk.ListItem
+    ) -> None:
+        row = list_item.get_child()
+
+        bb_day = row.item_object.item.bb_day
+        if bb_day:
+            self.bound_rows.remove(bb_day, row)
+
+        row.unbind()
+
+    @Gtk.Template.Callback()
+    def on_ingredient_teardown(
+        self,
+        factory: Gtk.SignalListItemFactory,
+        list_item: Gtk.ListItem
+    ) -> None:
+        row = list_item.get_child()
+        row.check_button.disconnect(row.toggled_handler)
+
     @Gtk.Template.Callback()
     def on_sidebar_activated(self, index: int, user_data: any) -> None:
-        print("sidebar activated")
+        logger.debug("Sidebar item activated")
         self.refresh_main_content()
 
     def add_meal_dialog(self, action: Gio.Action, parameter: GLib.Variant) -> None:
         def add_meal(name: str) -> None:
-            meal = Meal(name, Gio.ListStore(), False)
+            meal = Meal(self.create_meal_record(name))
 
-            self.sidebar_section_model.add_meal(meal)
+            self.insert_meal(meal)
+            self.log_meals()
 
-            print('------------')
-            for meal in list(self.sidebar.get_items()):
-                print(meal)
-
-            self.move_selected_ingredients_action.set_enabled(True)
+        from scrummy.new_meal_dialog import NewMealDialog
 
         dialog = NewMealDialog(add_meal)
         dialog.present(self)
@@ -438,24 +1274,13 @@ class ScrummyWindow(Adw.ApplicationWindow):
         action: Gio.Action,
         parameter: GLib.Variant
     ) -> None:
-        def add_ingredient(name: str, date: Optional[GLib.DateTime]) -> None:
-            ingredient = Ingredient(
-                name,
-                date,
-                self.move_selected_ingredients_action
-            )
+        def add_ingredient(name: str, bb_day: Optional[int]) -> None:
+            ingredient = FoodItem(name, bb_day)
             selected_item = self.sidebar.get_selected_item()
 
-            old_date = selected_item.get_bb_date()
+            self.add_items_to_meal(selected_item, [ingredient])
 
-            selected_item.add_ingredient(ingredient)
-            self.set_main_page(False)
-
-            if selected_item != self.unsorted_food:
-                self.sidebar_section_model.update_meal_position(
-                    selected_item,
-                    old_date
-                )
+        from scrummy.new_ingredient_dialog import NewIngredientDialog
 
         dialog = NewIngredientDialog(add_ingredient)
         dialog.present(self)